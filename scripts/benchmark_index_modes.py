@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+import faiss
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services import ann_index
+from src.services.vector_store import load_store
+
+REPORT_PATH = "data/benchmarks/index_modes.json"
+
+
+def synthetic_corpus(n, dim, n_queries, seed=0):
+    """
+    Clustered vectors, a closer stand-in for document embeddings than pure noise.
+    Queries are perturbed copies of held-out points from the same clusters.
+    """
+    rng = np.random.RandomState(seed)
+    n_clusters = max(1, n // 500)
+    centers = rng.randn(n_clusters, dim).astype('float32')
+    labels = rng.randint(n_clusters, size=n + n_queries)
+    points = centers[labels] + 0.6 * rng.randn(n + n_queries, dim).astype('float32')
+    faiss.normalize_L2(points)
+    return points[:n], points[n:]
+
+
+def store_corpus(n_queries, seed=0):
+    """Vectors from the local store, queries are noisy copies of stored chunks."""
+    store = load_store()
+    if store is None or len(store) == 0:
+        raise SystemExit("The vector store is empty, use --synthetic instead.")
+    embeddings = np.concatenate([np.asarray(segment.embeddings) for segment in store.segments])
+    rng = np.random.RandomState(seed)
+    picks = embeddings[rng.randint(len(embeddings), size=n_queries)]
+    queries = picks + 0.01 * rng.randn(*picks.shape).astype('float32')
+    return embeddings, queries.astype('float32')
+
+
+def measure(index, queries, k, refine_vectors=None, **search_params):
+    """
+    Per-query latency, queries are sent one by one like in the chatbot.
+    With refine_vectors, candidates are re-scored exactly as the store does for IVF-PQ.
+    """
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        if refine_vectors is not None:
+            _, ids = ann_index.search_index(index, query[None, :], k * ann_index.PQ_REFINE_FACTOR, **search_params)
+            _, ids = ann_index.refine_exact(query[None, :], ids, refine_vectors, k)
+        else:
+            _, ids = ann_index.search_index(index, query[None, :], k, **search_params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency of every index mode against exact search.")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="benchmark N synthetic vectors instead of the store")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embeddings, queries = synthetic_corpus(args.synthetic, args.dim, args.queries)
+        source = f"synthetic ({args.synthetic} clustered vectors, dim {args.dim})"
+    else:
+        embeddings, queries = store_corpus(args.queries)
+        source = f"vector store ({len(embeddings)} chunks)"
+    chunk_ids = np.arange(len(embeddings))
+    k = min(args.k, len(embeddings))
+    print(f"Benchmarking {source}, {len(queries)} queries, k={k}")
+
+    rows = []
+    truth = None
+    for mode in ann_index.INDEX_MODES:
+        start = time.perf_counter()
+        index = ann_index.build_index(embeddings, chunk_ids, mode)
+        build_seconds = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / (1024 * 1024)
+
+        if mode == "hnsw":
+            settings = [{"ef_search": ef} for ef in args.ef_search]
+        elif mode.startswith("ivf"):
+            settings = [{"nprobe": nprobe} for nprobe in args.nprobe]
+        else:
+            settings = [{}]
+        if mode == "ivf_pq":
+            settings = [dict(params, refine=refine) for params in settings for refine in (False, True)]
+
+        for params in settings:
+            search_params = {key: value for key, value in params.items() if key != "refine"}
+            refine_vectors = embeddings if params.get("refine") else None
+            found, latencies = measure(index, queries, k, refine_vectors=refine_vectors, **search_params)
+            if mode == "flat":
+                truth = found
+            row = {
+                "mode": mode, "params": params,
+                "recall_at_k": recall_at_k(found, truth),
+                "latency_ms_p50": float(np.percentile(latencies, 50)),
+                "latency_ms_p95": float(np.percentile(latencies, 95)),
+                "build_seconds": round(build_seconds, 3),
+                "index_size_mb": round(size_mb, 2),
+            }
+            rows.append(row)
+            print(f"{mode:9s} {json.dumps(params):34s} recall@{k}={row['recall_at_k']:.3f} "
+                  f"p50={row['latency_ms_p50']:.3f}ms p95={row['latency_ms_p95']:.3f}ms "
+                  f"build={build_seconds:.1f}s size={size_mb:.1f}MB")
+        del index
+
+    report = {
+        "source": source, "queries": len(queries), "k": k,
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPUs, faiss {faiss.__version__}",
+        "results": rows,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import argparse
+import platform
+import subprocess
+import tempfile
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows, memory is then left out of the report
+    resource = None
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.document_processing.chunker import chunk_text, estimate_tokens
+from src.document_processing.near_duplicates import collapse_near_duplicates
+from src.services.ann_index import INDEX_MODES, DEFAULT_INDEX_MODE
+from src.services.index_manager import load_index as load_metadata_index
+from src.services.vector_store import write_store, load_store
+from src.services.lexical_index import FUSION_DEPTH
+from src.services.ranking import lexical_candidates, lexical_only_rows, vector_hits, fused_rows
+from src.services.reranker import rerank_scores, RERANK_TOP_N, RERANK_MIN_RATIO
+
+PROCESSED_TEXT_DIR = "data/processed_documents/"
+QUESTIONS_PATH = "data/benchmarks/retrieval_questions.json"
+REPORT_PATH = "data/benchmarks/retrieval.json"
+# same dimension as models/embedding-001, so index sizes and search cost match production
+EMBEDDING_DIM = 768
+CHAR_NGRAM = 3
+K_VALUES = (1, 3, 5, 10)
+
+
+def normalize(text):
+    # PDFs use the Cyrillic schwa, typed text the Latin one
+    return re.sub(r"\s+", " ", text.replace("ә", "ə").replace("Ә", "Ə").casefold())
+
+
+class HashingEmbedder:
+    """
+    Deterministic local stand-in for the Gemini embedder: signed feature hashing
+    of words and character trigrams (which catch Azerbaijani suffixed forms),
+    sublinear term weights, unit length. Same input, same vector, on every machine.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        for word in re.findall(r"\w+", normalize(text)):
+            yield "w:" + word
+            padded = f"<{word}>"
+            for i in range(len(padded) - CHAR_NGRAM + 1):
+                yield "c:" + padded[i:i + CHAR_NGRAM]
+
+    def embed(self, text):
+        counts = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(self.dim, dtype='float32')
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode('utf-8'))
+            vector[h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + np.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts):
+        return np.stack([self.embed(text) for text in texts]) if texts else np.zeros((0, self.dim), 'float32')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def directory_size_mb(path):
+    total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return round(total / (1024 * 1024), 2)
+
+
+def load_corpus(text_dir):
+    """
+    Chunks every processed document the way the indexer does. Returns the stored
+    chunk texts, the title-prefixed texts that are embedded, their source files
+    and the seconds spent.
+    """
+    chunk_texts, embed_texts, source_files = [], [], []
+    metadata_index = load_metadata_index()
+    start = time.perf_counter()
+    for filename in sorted(os.listdir(text_dir)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(text_dir, filename), 'r', encoding='utf-8') as f:
+            chunks, _ = collapse_near_duplicates(chunk_text(f.read()))
+        base_filename = os.path.splitext(filename)[0]
+        title = metadata_index.get(base_filename, {}).get('title', base_filename.replace('_', ' '))
+        # like embed_document_chunks: the title is context for the embedding, the store keeps the chunk itself
+        chunk_texts.extend(chunks)
+        embed_texts.extend(f"Sənədin adı: {title}\n\nMəzmun: {chunk}" for chunk in chunks)
+        source_files.extend([filename] * len(chunks))
+    return chunk_texts, embed_texts, source_files, time.perf_counter() - start
+
+
+def is_relevant(question, source_file, chunk):
+    """A hit counts when it comes from a labelled source and contains one of the expected phrases."""
+    if source_file not in question['sources']:
+        return False
+    chunk = normalize(chunk)
+    return any(normalize(phrase) in chunk for phrase in question['expected'])
+
+
+def search(store, question, query_vector, top_k, allowed_sources, hybrid, min_score=None):
+    """
+    Ranks with the helpers semantic_search uses: with hybrid the BM25-only shortcut,
+    the fusion of vector and BM25 hits and the MMR pick, vector hits below
+    min_score left out.
+    """
+    if not hybrid:
+        rows, _ = vector_hits(store, query_vector[None, :], top_k, allowed_sources, min_score)
+    else:
+        depth = max(FUSION_DEPTH, 2 * top_k)
+        lexical_rows, coverage, lexical_scores = lexical_candidates(store, question, depth, allowed_sources)
+        rows = lexical_only_rows(store, question, lexical_rows, coverage, lexical_scores, top_k)
+        if rows is None:
+            dense, _ = vector_hits(store, query_vector[None, :], depth, allowed_sources, min_score)
+            rows = fused_rows(store, dense, lexical_rows, coverage, top_k)
+    return [(store.source_file(row), store.chunk_text(row), float(store.embedding(row) @ query_vector))
+            for row in rows]
+
+
+def rerank(question, hits):
+    """Reorders hits like the app's reranker and returns them with the number its cut-off would keep."""
+    scores = rerank_scores(question, [text for _, text, _ in hits], [score for _, _, score in hits],
+                           budget_ms=float('inf'))
+    order = np.argsort(-scores, kind='stable')
+    kept = sum(scores[i] >= RERANK_MIN_RATIO * scores[order[0]] for i in order[:RERANK_TOP_N]) if len(hits) else 0
+    return [hits[i] for i in order], int(kept)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path, max_drop):
+    """Prints the change against an earlier report. Returns False if a quality metric dropped by more than max_drop."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\nAgainst {baseline_path} (commit {baseline.get('commit')}):")
+    for key, value in report['metrics'].items():
+        old = baseline.get('metrics', {}).get(key)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+            continue
+        regressed = (key.startswith("recall") or key == "mrr") and value < old - max_drop
+        ok = ok and not regressed
+        print(f"  {key:22s} {old:>10} -> {value:<10} {'REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality and speed over the processed documents.")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--index-mode", choices=INDEX_MODES, default=DEFAULT_INDEX_MODE)
+    parser.add_argument("--retrieval", choices=("vector", "hybrid"), default="hybrid",
+                        help="vector search only, or fused with the BM25 index like the app")
+    parser.add_argument("--rerank", action="store_true", help="reorder the hits with the app's reranker")
+    parser.add_argument("--min-score", type=float, default=None,
+                        help="cosine similarity below which vector hits are dropped, like semantic_search's min_score")
+    parser.add_argument("--repeat", type=int, default=5, help="times every question is searched for the latency figures")
+    parser.add_argument("--output", default=REPORT_PATH)
+    parser.add_argument("--baseline", help="earlier report to compare with, exits with 1 on a quality regression")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="tolerated drop of recall@k and MRR")
+    args = parser.parse_args()
+    if args.baseline and os.path.abspath(args.baseline) == os.path.abspath(args.output):
+        parser.error("--output would overwrite the --baseline report, pass another --output")
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+    embedder = HashingEmbedder()
+    rss_before = peak_rss_mb()
+
+    chunk_texts, embed_texts, source_files, chunk_seconds = load_corpus(PROCESSED_TEXT_DIR)
+    start = time.perf_counter()
+    embeddings = embedder.embed_many(embed_texts)
+    embed_seconds = time.perf_counter() - start
+    print(f"{len(chunk_texts)} chunks from {len(set(source_files))} documents "
+          f"(chunking {chunk_seconds:.2f}s, local embedding {embed_seconds:.2f}s)")
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        start = time.perf_counter()
+        write_store(embeddings, chunk_texts, source_files, store_dir=store_dir, index_mode=args.index_mode)
+        store = load_store(store_dir)
+        build_seconds = time.perf_counter() - start
+        store_size = directory_size_mb(store_dir)
+
+        allowed_sources = set(source_files)
+        max_k = max(K_VALUES)
+        latencies, per_question, kept_counts = [], [], []
+        for question in questions:
+            query_vector = embedder.embed(question['question'])
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                hits = search(store, question['question'], query_vector, max_k, allowed_sources,
+                              args.retrieval == "hybrid", args.min_score)
+                if args.rerank:
+                    hits, kept = rerank(question['question'], hits)
+                latencies.append((time.perf_counter() - start) * 1000)
+            if args.rerank:
+                kept_counts.append(kept)
+            rank = next((i + 1 for i, (source_file, text, _) in enumerate(hits)
+                         if is_relevant(question, source_file, text)), None)
+            per_question.append({"question": question['question'], "rank": rank,
+                                 "top_source": hits[0][0] if hits else None})
+        del store
+
+    ranks = [entry['rank'] for entry in per_question]
+    metrics = {f"recall@{k}": round(sum(r is not None and r <= k for r in ranks) / len(ranks), 4) for k in K_VALUES}
+    metrics.update({
+        "mrr": round(sum(1.0 / r for r in ranks if r) / len(ranks), 4),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        "chunks": len(chunk_texts),
+        "avg_chunk_tokens": round(float(np.mean([estimate_tokens(text) for text in chunk_texts])), 1),
+        "chunk_seconds": round(chunk_seconds, 3),
+        "build_seconds": round(build_seconds, 3),
+        "store_size_mb": store_size,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    if kept_counts:
+        # chunks the reranker's cut-off would send to the LLM instead of five
+        metrics["mean_reranked_chunks"] = round(float(np.mean(kept_counts)), 2)
+    report = {
+        "commit": git_commit(),
+        "index_mode": args.index_mode,
+        "retrieval": args.retrieval,
+        "rerank": args.rerank,
+        "min_score": args.min_score,
+        "embedder": f"hashing (words + char {CHAR_NGRAM}-grams, dim {EMBEDDING_DIM})",
+        "questions": len(questions),
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPUs",
+        "rss_before_mb": rss_before,
+        "metrics": metrics,
+        "per_question": per_question,
+    }
+    for key, value in metrics.items():
+        print(f"  {key:22s} {value}")
+
+    # compared before writing, so a report can never be measured against itself
+    ok = not args.baseline or compare(report, args.baseline, args.max_drop)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nReport written to {args.output}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.ann_index import INDEX_MODES
+from src.services.vector_store import compact
+
+def main():
+    """
+    Switches the vector store to another index type without re-embedding:
+    all segments are merged and the index is rebuilt from the stored vectors.
+    """
+    parser = argparse.ArgumentParser(description="Rebuild the vector store index with a different index type.")
+    parser.add_argument("--mode", choices=INDEX_MODES, required=True)
+    args = parser.parse_args()
+
+    if compact(index_mode=args.mode):
+        print(f"Vector store rebuilt with '{args.mode}' index.")
+    else:
+        print("Nothing to do: the store is missing or already compacted with this index type.")
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,32 @@
 import os
 import sys
-import json
 import time
-import numpy as np
-import faiss
+import argparse
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-import google.generativeai as genai
-from google.api_core import exceptions as google_exceptions
-from src.document_processing.chunker import chunk_text
+from src.document_processing.chunker import iter_chunks
+from src.document_processing.near_duplicates import collapse_near_duplicates
 from src.services.google_client import configure_google_client
 from src.services.logger_service import setup_logger
+from src.services.vector_store import write_store
+from src.services.ann_index import INDEX_MODES, DEFAULT_INDEX_MODE
+from src.services.embedding_service import (
+    EmbeddingScheduler, gemini_embedder, embed_with_cache, BATCH_SIZE, REQUESTS_PER_MINUTE, MAX_WORKERS
+)
 
 logger = setup_logger()
 
 # Configuration
 PROCESSED_TEXT_DIR = "data/processed_documents/"
-VECTOR_STORE_PATH = "data/vector_store.json"
-FAISS_INDEX_PATH = "data/faiss_index.idx"
-EMBEDDING_MODEL = "models/embedding-001"
-BATCH_SIZE = 50
 
-def generate_and_store_embeddings():
+def generate_and_store_embeddings(index_mode=DEFAULT_INDEX_MODE, requests_per_minute=REQUESTS_PER_MINUTE,
+                                  workers=MAX_WORKERS):
     """
-    Processes all text files with a robust retry mechanism for API rate limits.
+    Embeds all text files concurrently within the API request budget. Chunks
+    whose text did not change since the last run are not re-embedded. Rate
+    limits and transient errors are retried per batch, a file whose batch
+    still fails is left out of the store.
     """
     configure_google_client()
     print("Starting embedding and indexing process...")
@@ -32,76 +34,64 @@ def generate_and_store_embeddings():
     
     files_to_process = [f for f in os.listdir(PROCESSED_TEXT_DIR) if f.endswith('.txt')]
 
-    # The outer loop for iterating through files now uses 'file_index'
+    file_chunks = []
     for file_index, filename in enumerate(files_to_process):
-        print(f"Processing file {file_index + 1}/{len(files_to_process)}: {filename}...")
-        
         file_path = os.path.join(PROCESSED_TEXT_DIR, filename)
         with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-            
-        chunks = chunk_text(text)
+            chunks, near_duplicates = collapse_near_duplicates(iter_chunks(f))
         if not chunks:
             print(f"  - Skipping {filename} as it has no content.")
             continue
-            
-        print(f"  - Generated {len(chunks)} chunks. Processing in batches of {BATCH_SIZE}...")
-        
-        # robust retry logic
-        # The inner loop for batches now uses 'batch_start_index'
-        for batch_start_index in range(0, len(chunks), BATCH_SIZE):
-            batch_chunks = chunks[batch_start_index : batch_start_index + BATCH_SIZE]
-            max_retries = 5
-            retry_delay = 10 
 
-            for attempt in range(max_retries):
-                try:
-                    print(f"    - Processing batch {batch_start_index//BATCH_SIZE + 1} (Attempt {attempt + 1})...")
-                    response = genai.embed_content(
-                        model=EMBEDDING_MODEL, content=batch_chunks, task_type="RETRIEVAL_DOCUMENT"
-                    )
-                    embeddings = response['embedding']
-                    
-                    for j, chunk in enumerate(batch_chunks):
-                        vector_store.append({
-                            "source_file": filename, "chunk_text": chunk, "embedding": embeddings[j]
-                        })
-                    
-                    print(f"    - Batch {batch_start_index//BATCH_SIZE + 1} successful.")
-                    time.sleep(1)
-                    break 
+        print(f"File {file_index + 1}/{len(files_to_process)}: {filename} -> {len(chunks)} chunks"
+              + (f" ({near_duplicates} near-duplicates left out)" if near_duplicates else ""))
+        file_chunks.append((filename, chunks))
 
-                except google_exceptions.ResourceExhausted as e:
-                    print(f"    - Rate limit hit. Waiting for {retry_delay} seconds before retrying...")
-                    logger.warning(f"Rate limit hit for {filename}. Retrying in {retry_delay}s.")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2 
-                    
-                    if attempt == max_retries - 1:
-                        logger.error(f"Failed to process {filename} after {max_retries} retries.")
-                        break 
-                except Exception as e:
-                    logger.error(f"An unexpected error occurred for {filename}: {e}")
-                    break 
-    
-    print(f"\nSaving vector store with {len(vector_store)} entries...")
-    with open(VECTOR_STORE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(vector_store, f)
-    print("Vector store saved.")
+    # one flat list for the whole library, so workers never idle between files;
+    # chunks embedded by an earlier run come from the chunk cache
+    all_chunks = [chunk for _, chunks in file_chunks for chunk in chunks]
+    print(f"Embedding {len(all_chunks)} chunks with {workers} workers at up to {requests_per_minute} requests/min...")
+    scheduler = EmbeddingScheduler(gemini_embedder("RETRIEVAL_DOCUMENT"),
+                                   requests_per_minute=requests_per_minute, max_workers=workers)
+    start = time.perf_counter()
+    embeddings, embedded_count = embed_with_cache(all_chunks, scheduler, batch_size=BATCH_SIZE,
+                                                  return_exceptions=True)
+    print(f"Embedding finished in {time.perf_counter() - start:.1f}s: {embedded_count} chunks sent to the API, "
+          f"{len(all_chunks) - embedded_count} unchanged ({scheduler.stats})")
+
+    position, failed_files = 0, []
+    for filename, chunks in file_chunks:
+        file_embeddings = embeddings[position:position + len(chunks)]
+        position += len(chunks)
+        if any(embedding is None for embedding in file_embeddings):
+            logger.error(f"Failed to embed {filename}, it is left out of the vector store.")
+            failed_files.append(filename)
+            continue
+        for chunk, embedding in zip(chunks, file_embeddings):
+            vector_store.append({"source_file": filename, "chunk_text": chunk, "embedding": embedding})
+    if failed_files:
+        print(f"Skipped {len(failed_files)} file(s) with failed batches: {', '.join(failed_files)}")
     
     if not vector_store:
-        print("No embeddings were generated. FAISS index will not be created.")
+        print("No embeddings were generated. Vector store will not be created.")
         return
 
-    print("\nBuilding FAISS index...")
-    embeddings = [entry['embedding'] for entry in vector_store]
-    embedding_matrix = np.array(embeddings).astype('float32')
-    d = embedding_matrix.shape[1]
-    index = faiss.IndexFlatL2(d)
-    index.add(embedding_matrix)
-    faiss.write_index(index, FAISS_INDEX_PATH)
-    print(f"FAISS index with {index.ntotal} vectors saved.")
+    print(f"\nSaving vector store with {len(vector_store)} entries...")
+    write_store(
+        embeddings=[entry['embedding'] for entry in vector_store],
+        chunk_texts=[entry['chunk_text'] for entry in vector_store],
+        source_files=[entry['source_file'] for entry in vector_store],
+        index_mode=index_mode,
+    )
+    print("Vector store saved.")
     print("Embedding and indexing process complete!")
 
 if __name__ == "__main__":
-    generate_and_store_embeddings()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Embed all processed documents and build the vector store.")
+    parser.add_argument("--index-mode", choices=INDEX_MODES, default=DEFAULT_INDEX_MODE,
+                        help="FAISS index type for the base segment (default: exact flat search)")
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE,
+                        help="embed_content requests allowed per minute")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="concurrent embedding requests")
+    args = parser.parse_args()
+    generate_and_store_embeddings(index_mode=args.index_mode, requests_per_minute=args.rpm, workers=args.workers)
\ No newline at end of file
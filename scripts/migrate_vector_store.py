@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.vector_store import write_store, VECTOR_STORE_DIR
+
+LEGACY_VECTOR_STORE_PATH = "data/vector_store.json"
+LEGACY_FAISS_INDEX_PATH = "data/faiss_index.idx"
+
+def migrate():
+    """
+    Converts the legacy JSON vector store into the memory-mapped store.
+    The FAISS index file is dropped, its vectors were a copy of the JSON ones.
+    """
+    if not os.path.exists(LEGACY_VECTOR_STORE_PATH):
+        print(f"Nothing to migrate, {LEGACY_VECTOR_STORE_PATH} not found.")
+        return
+
+    with open(LEGACY_VECTOR_STORE_PATH, 'r', encoding='utf-8') as f:
+        legacy_store = json.load(f)
+
+    print(f"Migrating {len(legacy_store)} chunks to {VECTOR_STORE_DIR}...")
+    write_store(
+        embeddings=[entry['embedding'] for entry in legacy_store],
+        chunk_texts=[entry['chunk_text'] for entry in legacy_store],
+        source_files=[entry['source_file'] for entry in legacy_store],
+    )
+    os.remove(LEGACY_VECTOR_STORE_PATH)
+    if os.path.exists(LEGACY_FAISS_INDEX_PATH):
+        os.remove(LEGACY_FAISS_INDEX_PATH)
+    print("Migration complete!")
+
+if __name__ == "__main__":
+    migrate()
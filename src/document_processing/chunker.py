@@ -1,16 +1,205 @@
+import math
 import re
 
-def chunk_text(text: str) -> list[str]:
+# chunk sizes in estimated embedding-model tokens
+TARGET_TOKENS = 300
+MAX_TOKENS = 500
+OVERLAP_TOKENS = 50
+# a heading only starts a new chunk once the current one has this much content
+MIN_CHUNK_TOKENS = 60
+# average characters per token for a word, Azerbaijani words split into several pieces
+CHARS_PER_TOKEN = 4
+# hard-wrapped text without blank lines is cut into blocks of about this size while streaming
+PARAGRAPH_FLUSH_CHARS = 8000
+
+_TOKEN = re.compile(r'\w+|[^\w\s]')
+_SENTENCE_END = re.compile(r'[.!?…]+["”»)]*\s+')
+_SENTENCE_OPENERS = '"“«(-–—•'
+_CLAUSE_NUMBER = re.compile(r'^(\d+(\.\d+)*\.?|[IVXLC]+\.|[a-zа-я]\))$')
+_NUMBERED_HEADING = re.compile(r'^(\d+(\.\d+)*\.?|[IVXLC]+\.)\s+\w')
+_KEYWORD_HEADING = re.compile(r'^(maddə|madde|fəsil|fesil|bölmə|bolme|hissə|hisse|əlavə|elave|'
+                              r'article|chapter|section|annex)\s+[\dIVXLC]+', re.IGNORECASE)
+# lowercase abbreviations that end with a period but not a sentence
+_ABBREVIATIONS = {"səh", "sәh", "seh", "mln", "mlrd", "st", "nöm", "no", "prof", "dos", "dr", "bax", "ş", "şәh",
+                  "şəh", "küç", "kuc", "və s", "vә s", "etc", "e.g", "i.e", "vs"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without calling the API: long words count as several tokens."""
+    return sum(max(1, math.ceil(len(token) / CHARS_PER_TOKEN)) for token in _TOKEN.findall(text))
+
+
+def _is_heading(line: str) -> bool:
+    if len(line) > 150 or line.endswith((',', ';')):
+        return False
+    if _KEYWORD_HEADING.match(line):
+        return True
+    if _NUMBERED_HEADING.match(line) and len(line) <= 100 and not line.endswith('.'):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and sum(c.isupper() for c in letters) / len(letters) >= 0.8
+
+
+def _iter_blocks(pieces):
+    """
+    Yields ('heading' | 'paragraph', text) from an iterable of text pieces (pages).
+    Paragraphs end at blank lines and headings; very long runs of hard-wrapped
+    lines are cut at a sentence end so memory stays bounded.
+    """
+    paragraph, size = [], 0
+    for piece in pieces:
+        for line in piece.splitlines():
+            line = line.strip()
+            if not line or _is_heading(line):
+                if paragraph:
+                    yield 'paragraph', "\n".join(paragraph)
+                    paragraph, size = [], 0
+                if line:
+                    yield 'heading', line
+                continue
+            paragraph.append(line)
+            size += len(line)
+            if size >= PARAGRAPH_FLUSH_CHARS and (line.endswith(('.', '!', '?', ':')) or
+                                                  size >= 4 * PARAGRAPH_FLUSH_CHARS):
+                yield 'paragraph', "\n".join(paragraph)
+                paragraph, size = [], 0
+    if paragraph:
+        yield 'paragraph', "\n".join(paragraph)
+
+
+def _ends_with_abbreviation(text: str) -> bool:
+    words = text.rsplit(None, 2)
+    if not words:
+        return False
+    last = words[-1].lstrip('("“«')
+    if len(last) == 1 and last.isalpha():
+        return True  # initials such as "İ. Əliyev"
+    return last.casefold() in _ABBREVIATIONS or " ".join(words[-2:]).casefold() in _ABBREVIATIONS
+
+
+def _split_sentences(text: str) -> list[str]:
+    """Sentence split that keeps abbreviations, initials and clause numbers (2.1.) intact."""
+    sentences, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+        if end >= len(text):
+            break
+        following = text[end]
+        if not (following.isupper() or following.isdigit() or following in _SENTENCE_OPENERS):
+            continue
+        sentence = text[start:end].strip()
+        if _CLAUSE_NUMBER.match(sentence) or _ends_with_abbreviation(text[start:match.start()]):
+            continue
+        sentences.append(sentence)
+        start = end
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def _pack(parts, separator: str, max_tokens: int) -> list[str]:
+    packed, current, size = [], [], 0
+    for part in parts:
+        tokens = estimate_tokens(part)
+        if current and size + tokens > max_tokens:
+            packed.append(separator.join(current))
+            current, size = [], 0
+        current.append(part)
+        size += tokens
+    if current:
+        packed.append(separator.join(current))
+    return packed
+
+
+def _split_word(word: str, max_tokens: int) -> list[str]:
+    """Cuts a single word longer than max_tokens (a URL, a base64 blob, a row of dots) by characters."""
+    width = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for start in range(0, len(word), width):
+        piece = word[start:start + width]
+        if estimate_tokens(piece) <= max_tokens:
+            pieces.append(piece)
+        else:
+            # punctuation counts a token per character, so such runs are cut to max_tokens characters
+            pieces.extend(piece[i:i + max_tokens] for i in range(0, len(piece), max_tokens))
+    return pieces
+
+
+def _split_oversized(sentence: str, max_tokens: int) -> list[str]:
+    """Cuts a unit longer than max_tokens at line breaks first, then between words, then inside words."""
+    lines = []
+    for line in sentence.split("\n"):
+        if estimate_tokens(line) <= max_tokens:
+            lines.append(line)
+            continue
+        words = [piece for word in line.split()
+                 for piece in ([word] if estimate_tokens(word) <= max_tokens else _split_word(word, max_tokens))]
+        lines.extend(_pack(words, " ", max_tokens))
+    return _pack(lines, "\n", max_tokens)
+
+
+def _iter_units(text: str, max_tokens: int):
+    for sentence in _split_sentences(text):
+        tokens = estimate_tokens(sentence)
+        if tokens <= max_tokens:
+            yield sentence, tokens
+        else:
+            for piece in _split_oversized(sentence, max_tokens):
+                yield piece, estimate_tokens(piece)
+
+
+def iter_chunks(pieces, target_tokens=TARGET_TOKENS, max_tokens=MAX_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    """
+    Streams chunks from an iterable of text pieces, e.g. the pages of a PDF.
+
+    Sentences are packed until a chunk reaches target_tokens, no chunk exceeds
+    max_tokens, and each chunk repeats up to overlap_tokens of trailing sentences
+    from the previous one. Headings start a new chunk without overlap.
+    """
+    current, size, fresh = [], 0, False
+
+    def render(units):
+        return "".join(separator + text for text, tokens, separator in units).strip()
+
+    for kind, text in _iter_blocks(pieces):
+        if kind == 'heading':
+            tokens = estimate_tokens(text)
+            if fresh and (size >= MIN_CHUNK_TOKENS or size + tokens > max_tokens):
+                yield render(current)
+                current, size, fresh = [], 0, False
+            for piece, piece_tokens in _iter_units(text, max_tokens):
+                current.append((piece, piece_tokens, "\n"))
+                size += piece_tokens
+            fresh = True
+            continue
+
+        separator = "\n"
+        for sentence, tokens in _iter_units(text, max_tokens):
+            if fresh and (size >= target_tokens or size + tokens > max_tokens):
+                yield render(current)
+                overlap, overlap_size = [], 0
+                for unit in reversed(current):
+                    if overlap_size + unit[1] > overlap_tokens:
+                        break
+                    overlap.insert(0, unit)
+                    overlap_size += unit[1]
+                if overlap_size + tokens > max_tokens:
+                    overlap, overlap_size = [], 0
+                current, size, fresh = overlap, overlap_size, False
+            current.append((sentence, tokens, separator))
+            size += tokens
+            fresh = True
+            separator = " "
+    if fresh:
+        yield render(current)
+
+
+def chunk_text(text: str, target_tokens=TARGET_TOKENS, max_tokens=MAX_TOKENS,
+               overlap_tokens=OVERLAP_TOKENS) -> list[str]:
     """
-    Splits text into chunks based on paragraphs.
+    Splits text into bounded, sentence-aligned chunks with overlap.
     """
     if not isinstance(text, str) or not text.strip():
         return []
-
-    # Split the text by two or more newlines (which signifies a paragraph break)
-    paragraphs = re.split(r'\n{2,}', text)
-    
-    # Filter out any resulting paragraphs that are empty or just whitespace
-    chunks = [p.strip() for p in paragraphs if p.strip()]
-    
-    return chunks
\ No newline at end of file
+    return list(iter_chunks([text], target_tokens, max_tokens, overlap_tokens))
@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+import docx
+import openpyxl
+from pptx import Presentation
+
+from .sheet_cache import iter_cached_rows, load_workbook_meta, workbook_properties
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.xlsx', '.pptx')
+
+# PDFs with at least this many pages are extracted by a process pool
+PARALLEL_PDF_MIN_PAGES = 40
+PDF_PAGES_PER_TASK = 8
+PDF_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+def _clean(value):
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _core_properties(props) -> dict:
+    """docx/pptx core properties, with the names used for every format."""
+    return {
+        "title": props.title, "author": props.author, "subject": props.subject, "creator": None,
+        "last_modified_by": props.last_modified_by,
+        "modified": props.modified.isoformat() if props.modified else None,
+    }
+
+
+def _pdf_page(page, extract_tables):
+    text = page.extract_text()
+    # tables reuse the layout objects already parsed for the text
+    tables = page.extract_tables() if extract_tables else []
+    # pdfplumber caches the parsed layout objects on the page until it is closed
+    page.close()
+    return text, tables
+
+
+def _extract_pdf_page_range(file_path, start, stop, extract_tables):
+    """Worker task: opens the PDF on its own and extracts pages [start, stop)."""
+    with pdfplumber.open(file_path) as pdf:
+        return [_pdf_page(pdf.pages[i], extract_tables) for i in range(start, stop)]
+
+
+def _iter_pdf_pages_parallel(file_path, page_count, extract_tables):
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    executor = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    pending = []
+    try:
+        # a bounded window of tasks, so finished pages never pile up ahead of the consumer
+        for start, stop in ranges:
+            pending.append(executor.submit(_extract_pdf_page_range, file_path, start, stop, extract_tables))
+            if len(pending) > 2 * PDF_WORKERS:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ParsedDocument:
+    """
+    One parse of a document shared by every stage. Opening it reads the core
+    properties and page count; pages() streams the text piece by piece (one
+    piece per PDF page) and fills `tables` along the way.
+
+        with ParsedDocument(path) as doc:
+            for page_text in doc.pages(): ...
+            doc.properties, doc.page_count, doc.tables
+    """
+
+    def __init__(self, file_source, file_extension=None, parallel=True, extract_tables=True):
+        if isinstance(file_source, str) and not file_extension:
+            _, file_extension = os.path.splitext(file_source)
+        self.file_source = file_source
+        self.extension = (file_extension or "").lower()
+        if self.extension not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {self.extension}")
+        self.parallel = parallel
+        self.extract_tables = extract_tables
+        self.properties = {}
+        self.page_count = None
+        self.tables = []
+        self._handle = None
+        self._open()
+
+    def _open(self):
+        if self.extension == '.pdf':
+            self._handle = pdfplumber.open(self.file_source)
+            info = self._handle.metadata or {}
+            self.properties = {"title": info.get('Title'), "author": info.get('Author'),
+                               "subject": info.get('Subject'), "creator": info.get('Creator'),
+                               "last_modified_by": None, "modified": None}
+            self.page_count = len(self._handle.pages)
+        elif self.extension == '.docx':
+            self._handle = docx.Document(self.file_source)
+            self.properties = _core_properties(self._handle.core_properties)
+        elif self.extension == '.pptx':
+            self._handle = Presentation(self.file_source)
+            self.properties = _core_properties(self._handle.core_properties)
+            self.page_count = len(self._handle.slides)
+        elif isinstance(self.file_source, str):
+            # workbooks on disk are parsed once into the sheet cache, shared with charting
+            meta = load_workbook_meta(self.file_source)
+            self.properties = meta['properties']
+            self.page_count = len(meta['sheets'])
+            self.tables = [{"sheet": sheet['name'], "rows": sheet['rows'], "columns": sheet.get('columns')}
+                           for sheet in meta['sheets']]
+        else:
+            self._handle = openpyxl.load_workbook(self.file_source, read_only=True, data_only=True)
+            self.properties = workbook_properties(self._handle)
+            self.page_count = len(self._handle.worksheets)
+        self.properties = {key: _clean(value) for key, value in self.properties.items()}
+
+    def pages(self):
+        if self.extension == '.pdf':
+            yield from self._pdf_pages()
+        elif self.extension == '.docx':
+            self.tables = [{"rows": [[cell.text for cell in row.cells] for row in table.rows]}
+                           for table in self._handle.tables]
+            yield "\n".join(para.text for para in self._handle.paragraphs)
+        elif self.extension == '.pptx':
+            yield self._pptx_text()
+        else:
+            yield self._xlsx_text()
+
+    def _pdf_pages(self):
+        self.tables = []
+        pdf_path = self.file_source if isinstance(self.file_source, str) else None
+        if self.parallel and pdf_path and self.page_count >= PARALLEL_PDF_MIN_PAGES and PDF_WORKERS > 1:
+            # workers open the file themselves, this handle is not needed any more
+            self.close()
+            results = _iter_pdf_pages_parallel(pdf_path, self.page_count, self.extract_tables)
+        else:
+            results = (_pdf_page(page, self.extract_tables) for page in self._handle.pages)
+        for page_number, (text, tables) in enumerate(results, start=1):
+            self.tables.extend({"page": page_number, "rows": table} for table in tables)
+            if text:
+                yield text
+
+    def _pptx_text(self):
+        full_text = []
+        self.tables = []
+        for slide_number, slide in enumerate(self._handle.slides, start=1):
+            for shape in slide.shapes:
+                if hasattr(shape, "text"): full_text.append(shape.text)
+                if getattr(shape, "has_table", False):
+                    rows = [[cell.text for cell in row.cells] for row in shape.table.rows]
+                    self.tables.append({"page": slide_number, "rows": rows})
+        return "\n".join(full_text)
+
+    def _xlsx_text(self):
+        if isinstance(self.file_source, str):
+            rows = iter_cached_rows(self.file_source)
+        else:
+            rows = ((index, sheet.title, row) for index, sheet in enumerate(self._handle.worksheets)
+                    for row in sheet.iter_rows(values_only=True))
+        full_text = []
+        for _, _, row in rows:
+            row_text = [str(value) for value in row if value is not None]
+            full_text.append(", ".join(row_text))
+        return "\n".join(full_text)
+
+    def close(self):
+        if self.extension in ('.pdf', '.xlsx') and self._handle is not None:
+            self._handle.close()
+        self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
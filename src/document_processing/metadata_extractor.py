@@ -1,10 +1,6 @@
 import os
 from datetime import datetime
-import pdfplumber
-import docx
-import openpyxl
-from pptx import Presentation
-import pptx
+from .document_parser import ParsedDocument, SUPPORTED_EXTENSIONS
 
 def _get_common_metadata(file_path):
     """Gets metadata common to all file types from the file system."""
@@ -21,10 +17,11 @@ def _get_common_metadata(file_path):
     except FileNotFoundError:
         return {}
 
-def extract_metadata(file_path):
+def extract_metadata(file_path, parsed=None):
     """
     Extracts metadata from a file by detecting its type.
     This function combines general file info with document-specific properties.
+    Pass the ParsedDocument of the file as `parsed` when its text was already read.
     """
     metadata = _get_common_metadata(file_path)
     
@@ -47,85 +44,28 @@ def extract_metadata(file_path):
     metadata['last_modified_by'] = 'Unknown'
     metadata['auto_category'] = 'General'  # Add default category
     
-    try:
-        if file_extension == '.pdf':
-            with pdfplumber.open(file_path) as pdf:
-                doc_properties = pdf.metadata or {}
-            
-            # Only override defaults if we have actual values
-            if doc_properties.get('Title') and doc_properties['Title'].strip():
-                metadata['title'] = doc_properties['Title'].strip()
-            if doc_properties.get('Author') and doc_properties['Author'].strip():
-                metadata['author'] = doc_properties['Author'].strip()
-            if doc_properties.get('Subject') and doc_properties['Subject'].strip():
-                metadata['subject'] = doc_properties['Subject'].strip()
-            if doc_properties.get('Creator') and doc_properties['Creator'].strip():
-                metadata['creator'] = doc_properties['Creator'].strip()
-
-        elif file_extension == '.docx':
-            try:
-                doc = docx.Document(file_path)
-                doc_properties = doc.core_properties
-                
-                if hasattr(doc_properties, 'title') and doc_properties.title and doc_properties.title.strip():
-                    metadata['title'] = doc_properties.title.strip()
-                if hasattr(doc_properties, 'author') and doc_properties.author and doc_properties.author.strip():
-                    metadata['author'] = doc_properties.author.strip()
-                if hasattr(doc_properties, 'subject') and doc_properties.subject and doc_properties.subject.strip():
-                    metadata['subject'] = doc_properties.subject.strip()
-                if hasattr(doc_properties, 'last_modified_by') and doc_properties.last_modified_by and doc_properties.last_modified_by.strip():
-                    metadata['last_modified_by'] = doc_properties.last_modified_by.strip()
-                
-                if hasattr(doc_properties, 'modified') and doc_properties.modified:
-                    metadata['document_modified_date'] = doc_properties.modified.isoformat()
-                    
-            except Exception as e:
-                print(f"Error extracting DOCX properties: {e}")
-
-        elif file_extension == '.xlsx':
+    if parsed is not None or file_extension in SUPPORTED_EXTENSIONS:
+        try:
+            # a document already parsed by the caller is reused instead of opening the file again
+            doc = parsed or ParsedDocument(file_path, file_extension, extract_tables=False)
             try:
-                wb = openpyxl.load_workbook(file_path)
-                doc_properties = wb.properties
-                
-                if hasattr(doc_properties, 'title') and doc_properties.title and doc_properties.title.strip():
-                    metadata['title'] = doc_properties.title.strip()
-                if hasattr(doc_properties, 'creator') and doc_properties.creator and doc_properties.creator.strip():
-                    metadata['author'] = doc_properties.creator.strip()
-                if hasattr(doc_properties, 'subject') and doc_properties.subject and doc_properties.subject.strip():
-                    metadata['subject'] = doc_properties.subject.strip()
-                if hasattr(doc_properties, 'lastModifiedBy') and doc_properties.lastModifiedBy and doc_properties.lastModifiedBy.strip():
-                    metadata['last_modified_by'] = doc_properties.lastModifiedBy.strip()
-                
-                if hasattr(doc_properties, 'modified') and doc_properties.modified:
-                    metadata['document_modified_date'] = doc_properties.modified.isoformat()
-                    
-            except Exception as e:
-                print(f"Error extracting XLSX properties: {e}")
+                # Only override defaults if we have actual values
+                for key in ('title', 'author', 'subject', 'creator', 'last_modified_by'):
+                    if doc.properties.get(key):
+                        metadata[key] = doc.properties[key]
+                if doc.properties.get('modified'):
+                    metadata['document_modified_date'] = doc.properties['modified']
+                metadata['page_count'] = doc.page_count
+                # tables are known once the text has been read, which only a caller's parse has done
+                if parsed is not None:
+                    metadata['table_count'] = len(doc.tables)
+            finally:
+                if parsed is None:
+                    doc.close()
+        except Exception as e:
+            print(f"Could not extract specific metadata for {metadata.get('file_name')}: {e}")
+            # Keep the meaningful defaults we set earlier
 
-        elif file_extension == '.pptx':
-            try:
-                prs = Presentation(file_path)
-                doc_properties = prs.core_properties
-                
-                if hasattr(doc_properties, 'title') and doc_properties.title and doc_properties.title.strip():
-                    metadata['title'] = doc_properties.title.strip()
-                if hasattr(doc_properties, 'author') and doc_properties.author and doc_properties.author.strip():
-                    metadata['author'] = doc_properties.author.strip()
-                if hasattr(doc_properties, 'subject') and doc_properties.subject and doc_properties.subject.strip():
-                    metadata['subject'] = doc_properties.subject.strip()
-                if hasattr(doc_properties, 'last_modified_by') and doc_properties.last_modified_by and doc_properties.last_modified_by.strip():
-                    metadata['last_modified_by'] = doc_properties.last_modified_by.strip()
-                
-                if hasattr(doc_properties, 'modified') and doc_properties.modified:
-                    metadata['document_modified_date'] = doc_properties.modified.isoformat()
-                    
-            except Exception as e:
-                print(f"Error extracting PPTX properties: {e}")
-            
-    except Exception as e:
-        print(f"Could not extract specific metadata for {metadata.get('file_name')}: {e}")
-        # Keep the meaningful defaults we set earlier
-    
     # Auto-categorize based on filename or content
     filename_lower = base_name.lower()
     if any(word in filename_lower for word in ['report', 'hesabat', 'annual']):
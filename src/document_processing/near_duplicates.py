@@ -0,0 +1,79 @@
+import hashlib
+import re
+import numpy as np
+
+# chunks whose 64-bit SimHashes differ in at most this many bits are candidate duplicates
+NEAR_DUPLICATE_MAX_DISTANCE = 3
+# a candidate is only dropped when this share of the two chunks' shingles is the same
+NEAR_DUPLICATE_MIN_JACCARD = 0.8
+# chunks with fewer distinct shingles (chart axes, page furniture) are too short to compare and always kept
+MIN_SHINGLES = 8
+# words per shingle; figures are words too, so rows that differ in their figures stay apart
+SHINGLE_WORDS = 3
+# SimHash bits are split into this many bands; with at most NEAR_DUPLICATE_MAX_DISTANCE
+# differing bits, two near-duplicates agree on at least one whole band
+_BANDS = NEAR_DUPLICATE_MAX_DISTANCE + 1
+_BAND_BITS = 64 // _BANDS
+
+# figures keep their separators ("92.8", "01.10.2023"), so a changed figure changes the shingle
+_WORD = re.compile(r'\d+(?:[.,/:-]\d+)*|\w+')
+
+
+def _shingles(text):
+    # one-character tokens are mostly chart-axis letters and tick labels, they would outvote the prose
+    words = [word for word in _WORD.findall(text.replace("ә", "ə").casefold()) if len(word) > 1]
+    if len(words) <= SHINGLE_WORDS:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text's word shingles: similar texts get hashes a few bits apart."""
+    return _fingerprint(_shingles(text))
+
+
+def _fingerprint(shingles) -> int:
+    hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+                       for shingle in shingles], dtype='uint64')
+    # bit b of every shingle hash votes +1 / -1 for bit b of the fingerprint
+    bits = np.unpackbits(hashes.view('uint8').reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0, dtype='int64') * 2 - len(hashes)
+    return int.from_bytes(np.packbits(votes > 0, bitorder='little').tobytes(), 'little')
+
+
+def _jaccard(a, b) -> float:
+    return len(a & b) / len(a | b)
+
+
+def collapse_near_duplicates(chunks, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE,
+                             min_jaccard: float = NEAR_DUPLICATE_MIN_JACCARD):
+    """
+    Drops every chunk of one document that is a near-duplicate of an earlier
+    one (repeated headers, boilerplate pages, the same table row block twice).
+    Candidates are found through SimHash bands, so the cost stays linear in the
+    number of chunks, and each is confirmed by the exact Jaccard similarity of
+    the shingle sets before anything is dropped. Chunks with fewer than
+    MIN_SHINGLES distinct shingles are always kept. Takes any iterable, returns
+    (kept_chunks, dropped_count) in the original order.
+    """
+    kept, shingle_sets, buckets = [], [], {}
+    dropped = 0
+    mask = (1 << _BAND_BITS) - 1
+    for chunk in chunks:
+        shingles = _shingles(chunk)
+        shingle_set = set(shingles)
+        if len(shingle_set) < MIN_SHINGLES:
+            kept.append(chunk)
+            continue
+        fingerprint = _fingerprint(shingles)
+        bands = [(band, (fingerprint >> (band * _BAND_BITS)) & mask) for band in range(_BANDS)]
+        candidates = {i for key in bands for i in buckets.get(key, ())}
+        if any(bin(fingerprint ^ shingle_sets[i][0]).count("1") <= max_distance and
+               _jaccard(shingle_set, shingle_sets[i][1]) >= min_jaccard for i in candidates):
+            dropped += 1
+            continue
+        for key in bands:
+            buckets.setdefault(key, []).append(len(shingle_sets))
+        shingle_sets.append((fingerprint, shingle_set))
+        kept.append(chunk)
+    return kept, dropped
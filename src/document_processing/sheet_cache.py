@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SHEET_CACHE_DIR = "data/cache/sheets"
+META_FILE = "meta.json"
+# rows converted to Arrow at a time while streaming a sheet
+ROW_BATCH_SIZE = 5000
+
+# one builder per workbook in this process, other threads wait and read its result
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+
+def _cache_path(file_path):
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(SHEET_CACHE_DIR, key)
+
+
+def _signature(file_path):
+    stat = os.stat(file_path)
+    return {"source": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_meta(cache_path):
+    try:
+        with open(os.path.join(cache_path, META_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _is_current(meta, signature) -> bool:
+    return meta is not None and 'properties' in meta and all(meta.get(key) == value
+                                                             for key, value in signature.items())
+
+
+def _to_batch(rows, width):
+    # every cell is kept as the text it reads as, empty cells as nulls
+    columns = [[None if i >= len(row) or row[i] is None else str(row[i]) for row in rows] for i in range(width)]
+    return pa.record_batch([pa.array(column, type=pa.string()) for column in columns],
+                           names=[f"c{i}" for i in range(width)])
+
+
+class _DimensionMismatch(Exception):
+    pass
+
+
+def _write_batch(writer, path, rows, width):
+    batch = _to_batch(rows, width)
+    writer = writer or pq.ParquetWriter(path, batch.schema)
+    writer.write_batch(batch)
+    return writer
+
+
+def _trim(row):
+    # dimension records often claim far more columns than hold data (A1:XFD25)
+    end = len(row)
+    while end and row[end - 1] is None:
+        end -= 1
+    return row[:end]
+
+
+def _write_sheet(sheet, path, buffered=False):
+    """
+    Streams one sheet into a Parquet file in batches of ROW_BATCH_SIZE rows and
+    returns (row_count, column_count). The column count is taken from the first batch; a
+    later, wider row raises _DimensionMismatch so the sheet can be re-read buffered.
+    """
+    width = None
+    writer, rows, row_count = None, [], 0
+    try:
+        for row in sheet.iter_rows(values_only=True):
+            row = _trim(row)
+            row_count += 1
+            if writer and len(row) > width:
+                raise _DimensionMismatch()
+            rows.append(row)
+            if not buffered and len(rows) >= ROW_BATCH_SIZE:
+                width = width or max(1, max(len(row) for row in rows))
+                writer = _write_batch(writer, path, rows, width)
+                rows = []
+        if rows:
+            width = width or max(1, max(len(row) for row in rows))
+            writer = _write_batch(writer, path, rows, width)
+    finally:
+        if writer:
+            writer.close()
+    return row_count, width or 0
+
+
+def _build(file_path, cache_path):
+    """Streams the workbook once and writes every sheet to its own Parquet file."""
+    signature = _signature(file_path)
+    # a directory of its own, so builders in other threads or processes never share half-written files
+    tmp_path = tempfile.mkdtemp(prefix=os.path.basename(cache_path) + ".tmp-", dir=SHEET_CACHE_DIR)
+    try:
+        sheets = []
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet_index, sheet in enumerate(workbook.worksheets):
+                file_name = f"sheet-{sheet_index:03d}.parquet"
+                sheet_path = os.path.join(tmp_path, file_name)
+                try:
+                    row_count, column_count = _write_sheet(sheet, sheet_path)
+                except _DimensionMismatch:
+                    # a row further down is wider than the first batch, read the sheet again buffered
+                    row_count, column_count = _write_sheet(sheet, sheet_path, buffered=True)
+                sheets.append({"name": sheet.title, "file": file_name if row_count else None,
+                               "rows": row_count, "columns": column_count})
+            properties = workbook_properties(workbook)
+        finally:
+            workbook.close()
+
+        meta = dict(signature, sheets=sheets, properties=properties)
+        with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        return _publish(tmp_path, cache_path, meta)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _publish(tmp_path, cache_path, meta):
+    """Moves a finished build into place. If another process published first, its metadata is returned."""
+    # the stale cache is renamed aside instead of deleted, so the gap without a cache is one rename
+    stale_path = tmp_path + ".stale"
+    try:
+        os.rename(cache_path, stale_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # a builder in another process got there between the two renames
+        winner = _read_meta(cache_path)
+        if winner is None:
+            raise
+        meta = winner
+    finally:
+        shutil.rmtree(stale_path, ignore_errors=True)
+    return meta
+
+
+def workbook_properties(workbook) -> dict:
+    """Core document properties of an open workbook, with the names used for every format."""
+    props = workbook.properties
+    return {
+        "title": props.title, "author": props.creator, "subject": props.subject, "creator": None,
+        "last_modified_by": props.lastModifiedBy,
+        "modified": props.modified.isoformat() if props.modified else None,
+    }
+
+
+def load_workbook_meta(file_path) -> dict:
+    """
+    Returns the cache metadata of a workbook (sheets with their sizes and the
+    document properties), parsing it only when the file is new or changed.
+    """
+    cache_path = _cache_path(file_path)
+    meta = _read_meta(cache_path)
+    signature = _signature(file_path)
+    if _is_current(meta, signature):
+        return meta
+    os.makedirs(SHEET_CACHE_DIR, exist_ok=True)
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(cache_path, threading.Lock())
+    with lock:
+        # another thread may have built it while this one waited
+        meta = _read_meta(cache_path)
+        if _is_current(meta, _signature(file_path)):
+            return meta
+        return _build(file_path, cache_path)
+
+
+
+def ensure_sheet_cache(file_path):
+    """Returns the cached sheet list of a workbook, building the cache when needed."""
+    return load_workbook_meta(file_path)['sheets']
+
+
+def iter_cached_rows(file_path):
+    """Streams (sheet_index, sheet_name, row_values) from the cache, batch by batch."""
+    cache_path = _cache_path(file_path)
+    for sheet_index, sheet in enumerate(ensure_sheet_cache(file_path)):
+        if not sheet['file']:
+            continue
+        parquet_file = pq.ParquetFile(os.path.join(cache_path, sheet['file']))
+        for batch in parquet_file.iter_batches(batch_size=ROW_BATCH_SIZE):
+            columns = batch.to_pydict()
+            for row in zip(*columns.values()):
+                yield sheet_index, sheet['name'], row
+
+
+def load_sheet(file_path, sheet_index: int = 0) -> pd.DataFrame:
+    """
+    The cached sheet as a DataFrame without a header row, like
+    pd.read_excel(header=None). Cells are strings, numbers need pd.to_numeric.
+    """
+    sheets = ensure_sheet_cache(file_path)
+    if sheet_index >= len(sheets) or not sheets[sheet_index]['file']:
+        return pd.DataFrame()
+    df = pq.read_table(os.path.join(_cache_path(file_path), sheets[sheet_index]['file'])).to_pandas()
+    df.columns = range(len(df.columns))
+    return df
+
+
+def remove_sheet_cache(file_path):
+    shutil.rmtree(_cache_path(file_path), ignore_errors=True)
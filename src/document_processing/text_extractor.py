@@ -1,60 +1,33 @@
-import pdfplumber
-import docx
-import openpyxl
-from pptx import Presentation
 import os
-import io
+from .document_parser import ParsedDocument, SUPPORTED_EXTENSIONS
 
-def _extract_text_from_pdf(file_obj):
-    full_text = []
-    with pdfplumber.open(file_obj) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text: full_text.append(page_text)
-    return "\n".join(full_text)
-
-def _extract_text_from_docx(file_obj):
-    doc = docx.Document(file_obj)
-    return "\n".join([para.text for para in doc.paragraphs])
-
-def _extract_text_from_excel(file_obj):
-    workbook = openpyxl.load_workbook(file_obj)
-    full_text = []
-    for sheet in workbook.worksheets:
-        for row in sheet.iter_rows():
-            row_text = [str(cell.value) for cell in row if cell.value is not None]
-            full_text.append(", ".join(row_text))
-    return "\n".join(full_text)
-    
-def _extract_text_from_pptx(file_obj):
-    prs = Presentation(file_obj)
-    full_text = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"): full_text.append(shape.text)
-    return "\n".join(full_text)
+def iter_text(file_source, file_extension=None, parallel=True):
+    """
+    Yields the text of a file piece by piece: one piece per page for PDFs, the
+    whole text for other formats. Paths are read directly, not copied into memory.
+    parallel=False keeps PDF extraction in this process, for callers that only
+    read the first pages.
+    """
+    # text-only callers skip table detection, ParsedDocument gives both in one pass
+    with ParsedDocument(file_source, file_extension, parallel=parallel, extract_tables=False) as doc:
+        yield from doc.pages()
 
-def extract_text(file_source, file_extension=None):
+def extract_text(file_source, file_extension=None, max_chars=None):
     """
     Extracts text from a file source, which can be a file path (string)
-    or a file-like object (bytes).
+    or a file-like object (bytes). With max_chars, extraction stops once
+    that much text is available and the result is cut to it.
     """
-    if isinstance(file_source, str): 
-        if not file_extension:
-            _, file_extension = os.path.splitext(file_source)
-        with open(file_source, 'rb') as f:
-            file_obj = io.BytesIO(f.read())
-    else: 
-        file_obj = file_source
+    if isinstance(file_source, str) and not file_extension:
+        _, file_extension = os.path.splitext(file_source)
+    if file_extension.lower() not in SUPPORTED_EXTENSIONS:
+        return f"Unsupported file type: {file_extension.lower()}"
 
-    ext = file_extension.lower()
-    if ext == '.pdf': 
-        return _extract_text_from_pdf(file_obj)
-    elif ext == '.docx': 
-        return _extract_text_from_docx(file_obj)
-    elif ext == '.xlsx': 
-        return _extract_text_from_excel(file_obj)
-    elif ext == '.pptx': 
-        return _extract_text_from_pptx(file_obj)
-    else: 
-        return f"Unsupported file type: {ext}"
\ No newline at end of file
+    pieces, size = [], 0
+    for piece in iter_text(file_source, file_extension, parallel=max_chars is None):
+        pieces.append(piece)
+        size += len(piece) + 1
+        if max_chars is not None and size >= max_chars:
+            break
+    text = "\n".join(pieces)
+    return text[:max_chars] if max_chars is not None else text
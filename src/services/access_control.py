@@ -1,22 +1,157 @@
-from .index_manager import load_index
+import os
+import threading
+
+from .index_manager import load_snapshot, read_log, add_log_listener, METADATA_INDEX_PATH, METADATA_LOG_PATH
+
+ADMIN_ROLE = "Admin"
+# documents of this team are visible to every role
+SHARED_TEAM = "Unassigned"
+
+
+def _visible(role, metadata) -> bool:
+    # An Admin can see all documents, regular users see documents for their team or unassigned ones
+    return role == ADMIN_ROLE or metadata.get('team') in (role, SHARED_TEAM)
+
+
+class _RoleView:
+    """The documents one role may see, keyed like the metadata index, and their processed text files."""
+
+    def __init__(self):
+        self.documents = {}
+        self.source_files = set()
+        self._document_list = None
+        self._frozen_sources = None
+
+    def put(self, key, metadata):
+        self.documents[key] = metadata
+        # chunks in the store are keyed by their processed text file
+        self.source_files.add(key + ".txt")
+        self._document_list = self._frozen_sources = None
+
+    def discard(self, key):
+        if self.documents.pop(key, None) is not None:
+            self.source_files.discard(key + ".txt")
+            self._document_list = self._frozen_sources = None
+
+    def document_list(self) -> list:
+        if self._document_list is None:
+            self._document_list = list(self.documents.values())
+        return self._document_list
+
+    def frozen_sources(self) -> frozenset:
+        # the same object until the next change, so it hashes once and keys the vector store's mask cache
+        if self._frozen_sources is None:
+            self._frozen_sources = frozenset(self.source_files)
+        return self._frozen_sources
+
+
+class RoleVisibilityIndex:
+    """
+    Precomputed role -> visible documents map, so permission checks are set
+    lookups instead of a scan over the whole metadata index.
+
+    Built once from document_index.json plus its change log. Afterwards every
+    change written through index_manager is applied to the affected role views
+    as it is logged, and lines appended by other processes are picked up by
+    replaying only the new tail of the log. A compacted or replaced snapshot
+    triggers one full rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._snapshot_stat = None
+        self._log_offset = None
+        self._documents = {}
+        self._views = {}
+
+    def _sync(self):
+        snapshot_stat = _stat(METADATA_INDEX_PATH)
+        log_size = (_stat(METADATA_LOG_PATH) or (0, 0))[1]
+        if self._log_offset is None or snapshot_stat != self._snapshot_stat or log_size < self._log_offset:
+            self._rebuild(snapshot_stat)
+        elif log_size > self._log_offset:
+            entries, self._log_offset = read_log(self._log_offset)
+            self._apply(entries)
+
+    def _rebuild(self, snapshot_stat):
+        self._snapshot_stat = snapshot_stat
+        self._documents = load_snapshot()
+        self._views = {}
+        entries, self._log_offset = read_log()
+        self._apply(entries)
+
+    def _apply(self, entries):
+        for entry in entries:
+            key = entry.get('key')
+            if entry.get('op') == 'put':
+                self._documents[key] = entry['metadata']
+                for role, view in self._views.items():
+                    if _visible(role, entry['metadata']):
+                        view.put(key, entry['metadata'])
+                    else:
+                        # a team change moves the document out of this role
+                        view.discard(key)
+            elif entry.get('op') == 'delete':
+                self._documents.pop(key, None)
+                for view in self._views.values():
+                    view.discard(key)
+
+    def on_log_write(self, entries, start, end):
+        """index_manager hook: applies a change this process just logged, unless the log moved on without us."""
+        with self._lock:
+            if self._log_offset == start and _stat(METADATA_INDEX_PATH) == self._snapshot_stat:
+                self._apply(entries)
+                self._log_offset = end
+
+    def _view(self, role) -> _RoleView:
+        with self._lock:
+            self._sync()
+            view = self._views.get(role)
+            if view is None:
+                view = _RoleView()
+                for key, metadata in self._documents.items():
+                    if _visible(role, metadata):
+                        view.put(key, metadata)
+                self._views[role] = view
+            return view
+
+    def documents(self, role) -> list:
+        return self._view(role).document_list()
+
+    def source_files(self, role) -> frozenset:
+        return self._view(role).frozen_sources()
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+
+_role_index = None
+_role_index_lock = threading.Lock()
+
+
+def get_role_index() -> RoleVisibilityIndex:
+    """Process-wide role visibility index, kept current by every index_manager write."""
+    global _role_index
+    with _role_index_lock:
+        if _role_index is None:
+            _role_index = RoleVisibilityIndex()
+            add_log_listener(_role_index.on_log_write)
+        return _role_index
+
 
 def get_accessible_documents(user_role: str) -> list:
     """
-    Loads the document index and returns a list of documents
-    accessible to the given user role.
+    Returns the documents accessible to the given user role from the
+    precomputed role index. The list is shared, callers must not modify it.
     """
-    all_documents = load_index()
-    if not all_documents:
-        return []
-
-    user_documents = []
-    # An Admin can see all documents
-    if user_role == "Admin":
-        return list(all_documents.values())
-        
-    # Regular users see documents for their team or unassigned ones
-    for doc_key, doc_metadata in all_documents.items():
-        if doc_metadata.get('team') == user_role or doc_metadata.get('team') == 'Unassigned':
-            user_documents.append(doc_metadata)
-            
-    return user_documents
\ No newline at end of file
+    return get_role_index().documents(user_role)
+
+
+def get_accessible_source_files(user_role: str) -> frozenset:
+    """Processed text files whose chunks the role may search, as one reusable frozenset."""
+    return get_role_index().source_files(user_role)
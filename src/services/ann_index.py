@@ -0,0 +1,142 @@
+import math
+import faiss
+import numpy as np
+
+INDEX_MODES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+DEFAULT_INDEX_MODE = "flat"
+# segments smaller than this are always searched exactly, an ANN index would not pay off
+MIN_ANN_ROWS = 10000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+
+# None picks ~4 * sqrt(n) lists
+IVF_NLIST = None
+IVF_NPROBE = 32
+# faiss wants ~39 training points per centroid, more only slows training down
+IVF_TRAINING_POINTS_PER_LIST = 64
+
+# sub-quantizers per vector, must divide the dimension (768 / 96 = 8 dims each)
+PQ_M = 96
+PQ_NBITS = 8
+# PQ distances are coarse: fetch this many times k and re-score them exactly
+PQ_REFINE_FACTOR = 8
+
+
+def _nlist_for(n):
+    return IVF_NLIST or max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m_for(dim):
+    m = min(PQ_M, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(embeddings, chunk_ids, mode: str, metric=faiss.METRIC_INNER_PRODUCT):
+    """
+    Builds an ID-mapped FAISS index over one segment. The store keeps unit-length
+    vectors, so the default inner-product metric ranks by cosine similarity.
+
+    flat      exact search, used for every segment below MIN_ANN_ROWS
+    hnsw      graph index, best latency/recall but keeps its own copy of the vectors
+    ivf_flat  inverted lists over the raw vectors, needs a training step
+    ivf_pq    inverted lists over product-quantized codes, smallest footprint
+    """
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode '{mode}', expected one of {INDEX_MODES}")
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    n, dim = embeddings.shape
+
+    if mode == "flat":
+        base = faiss.IndexFlat(dim, metric)
+    elif mode == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, HNSW_M, metric)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        nlist = _nlist_for(n)
+        quantizer = faiss.IndexFlat(dim, metric)
+        if mode == "ivf_flat":
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m_for(dim), PQ_NBITS, metric)
+        # PQ also trains 2^nbits centroids per sub-quantizer
+        centroids = nlist if mode == "ivf_flat" else max(nlist, 2 ** PQ_NBITS)
+        training_size = min(n, centroids * IVF_TRAINING_POINTS_PER_LIST)
+        sample = embeddings[np.random.RandomState(0).choice(n, training_size, replace=False)]
+        base.train(sample)
+
+    index = faiss.IndexIDMap(base)
+    index.add_with_ids(embeddings, np.asarray(chunk_ids, dtype='int64'))
+    return index
+
+
+def index_mode(index) -> str:
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def search_index(index, queries, k: int, excluded_ids=None, allowed_ids=None,
+                 nprobe: int = None, ef_search: int = None):
+    """
+    Searches an index built by build_index. Excluded or allowed chunk ids are
+    applied inside FAISS through an IDSelector, so filtered-out chunks never
+    take result slots. Returns (scores, chunk_ids), padded with -1 ids.
+    """
+    # selectors must stay referenced until the search is done
+    selectors = []
+    if allowed_ids is not None:
+        selectors.append(faiss.IDSelectorBatch(np.asarray(allowed_ids, dtype='int64')))
+    elif excluded_ids is not None and len(excluded_ids):
+        selectors.append(faiss.IDSelectorBatch(np.asarray(excluded_ids, dtype='int64')))
+        selectors.append(faiss.IDSelectorNot(selectors[0]))
+    selector = selectors[-1] if selectors else None
+
+    mode = index_mode(index)
+    if mode == "hnsw":
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(ef_search or HNSW_EF_SEARCH, k))
+    elif mode in ("ivf_flat", "ivf_pq"):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or IVF_NPROBE)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(np.ascontiguousarray(queries, dtype='float32'), k, params=params)
+
+
+def refine_exact(queries, candidate_rows, vectors, k: int):
+    """
+    Re-scores ANN candidates with exact inner products read from the raw vectors
+    (the memory-mapped segment matrix), keeping the best k per query.
+    """
+    scores = np.full(candidate_rows.shape, -np.inf, dtype='float32')
+    for q, rows in enumerate(candidate_rows):
+        valid = rows >= 0
+        if valid.any():
+            # sorted row order keeps reads from the memory map sequential
+            order = np.argsort(rows[valid])
+            candidates = np.asarray(vectors[rows[valid][order]], dtype='float32')
+            scores[q, np.flatnonzero(valid)[order]] = candidates @ queries[q]
+    top = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    scores = np.take_along_axis(scores, top, axis=1)
+    rows = np.take_along_axis(candidate_rows, top, axis=1)
+    rows[np.isneginf(scores)] = -1
+    return scores, rows
+
+
+def read_index(path):
+    """Memory-maps the index where FAISS supports it, so large indexes open quickly."""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def write_index(index, path):
+    faiss.write_index(index, path)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+
+from .embedding_cache import CACHE_DB_PATH
+
+# minimum cosine similarity between the new and the cached question
+ANSWER_CACHE_SIMILARITY = 0.95
+# cached answers older than this are ignored and eventually purged
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _connect():
+    os.makedirs(os.path.dirname(CACHE_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=5)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS answer_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role TEXT NOT NULL,
+            chunk_key TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            response TEXT NOT NULL,
+            created REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_lookup ON answer_cache (role, chunk_key)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS answer_cache_sources (
+            entry_id INTEGER NOT NULL,
+            source_file TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_source ON answer_cache_sources (source_file)")
+    return conn
+
+
+def _chunk_key(chunk_ids, history=""):
+    key = ",".join(str(chunk_id) for chunk_id in sorted(set(int(c) for c in chunk_ids)))
+    # a follow-up question depends on the conversation, not only on the retrieved chunks
+    if history:
+        key += "|" + hashlib.sha256(history.encode('utf-8')).hexdigest()[:16]
+    return key
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype='float32')
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def lookup_answer(query_embedding, chunk_ids, user_role, history=""):
+    """
+    Returns a cached JSON response for a question that retrieved exactly the same
+    chunks for the same role, after the same formatted chat history, and is
+    semantically close enough, otherwise None.
+    """
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT embedding, response FROM answer_cache WHERE role = ? AND chunk_key = ? AND created > ?",
+            (user_role, _chunk_key(chunk_ids, history), time.time() - ANSWER_CACHE_TTL_SECONDS)
+        ).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return None
+
+    cached = np.stack([np.frombuffer(row[0], dtype='float32') for row in rows])
+    similarities = cached @ _unit(query_embedding)
+    best = int(np.argmax(similarities))
+    if similarities[best] >= ANSWER_CACHE_SIMILARITY:
+        return rows[best][1]
+    return None
+
+
+def store_answer(query_embedding, chunk_ids, user_role, source_files, response: str, history=""):
+    conn = _connect()
+    try:
+        cursor = conn.execute(
+            "INSERT INTO answer_cache (role, chunk_key, embedding, response, created) VALUES (?, ?, ?, ?, ?)",
+            (user_role, _chunk_key(chunk_ids, history), _unit(query_embedding).tobytes(), response, time.time())
+        )
+        conn.executemany("INSERT INTO answer_cache_sources (entry_id, source_file) VALUES (?, ?)",
+                         [(cursor.lastrowid, source_file) for source_file in set(source_files)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def invalidate_documents(source_files):
+    """Drops every cached answer built from any of the given source files."""
+    source_files = list(source_files)
+    if not source_files:
+        return
+    placeholders = ",".join("?" * len(source_files))
+    conn = _connect()
+    try:
+        conn.execute(f"""
+            DELETE FROM answer_cache WHERE id IN (
+                SELECT entry_id FROM answer_cache_sources WHERE source_file IN ({placeholders})
+            ) OR created <= ?
+        """, (*source_files, time.time() - ANSWER_CACHE_TTL_SECONDS))
+        conn.execute("DELETE FROM answer_cache_sources WHERE entry_id NOT IN (SELECT id FROM answer_cache)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def is_cacheable(response: str) -> bool:
+    """Only well-formed answers are cached, never error messages."""
+    try:
+        return bool(json.loads(response).get("answer_text"))
+    except (json.JSONDecodeError, AttributeError):
+        return False
@@ -3,6 +3,7 @@ import plotly.express as px
 import streamlit as st
 import os
 import numpy as np
+from document_processing.sheet_cache import load_sheet
 
 def create_chart(file_path: str, chart_info: dict, lang: str):
 
@@ -13,8 +14,13 @@ def create_chart(file_path: str, chart_info: dict, lang: str):
         if not file_path.endswith(('.xlsx', '.xls', '.csv')):
             return None
             
-        # read the entire sheet without assuming a header
-        df = pd.read_excel(file_path, header=None) if file_path.endswith(('.xlsx', '.xls')) else pd.read_csv(file_path, header=None)
+        # read the entire sheet without assuming a header; .xlsx comes from the parsed sheet cache
+        if file_path.endswith('.xlsx'):
+            df = load_sheet(file_path)
+        elif file_path.endswith('.xls'):
+            df = pd.read_excel(file_path, header=None)
+        else:
+            df = pd.read_csv(file_path, header=None)
         
         if df.empty: return None
 
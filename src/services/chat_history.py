@@ -0,0 +1,103 @@
+import google.generativeai as genai
+
+from document_processing.chunker import estimate_tokens
+from .google_client import configure_google_client
+from .metrics_service import span
+from services.logger_service import setup_logger
+
+logger = setup_logger()
+
+# latest question/answer exchanges sent to the model word for word
+RECENT_TURNS = 3
+# upper bound for the whole history block of the prompt (summary + recent turns)
+HISTORY_TOKEN_BUDGET = 1200
+# length of the running summary of everything older than the recent turns
+SUMMARY_TOKEN_BUDGET = 300
+# a single message longer than this is cut before it enters the prompt
+MESSAGE_TOKEN_LIMIT = 400
+SUMMARY_STATE_KEY = "history_summary"
+SUMMARY_MODEL = 'gemini-1.5-flash'
+
+
+def message_text(message) -> str:
+    """
+    The text of a chat message as the model should see it. Assistant messages
+    keep only their answer text; charts, file paths and other payloads are dropped.
+    """
+    content = message.get("content")
+    if isinstance(content, dict):
+        content = content.get("answer_text") or ""
+    return str(content or "").strip()
+
+
+def _truncate(text, max_tokens):
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # chunker estimate is ~4 characters per token
+    return text[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+
+
+def _summarize(summary, messages) -> str:
+    """Folds messages into the running summary with one short LLM call, extractively if that fails."""
+    turns = "\n".join(f"{m['role']}: {_truncate(message_text(m), MESSAGE_TOKEN_LIMIT)}" for m in messages)
+    prompt = f"""
+    Update the running summary of a conversation between a user and a document assistant.
+    Keep the facts, figures, document names and open questions a follow-up question might refer to.
+    Write at most {SUMMARY_TOKEN_BUDGET * 3 // 4} words, in the language of the conversation, as plain text.
+
+    CURRENT SUMMARY:
+    {summary or "(empty)"}
+
+    NEW TURNS:
+    {turns}
+
+    UPDATED SUMMARY:
+    """
+    try:
+        configure_google_client()
+        with span("history_summary", folded_messages=len(messages), prompt_chars=len(prompt)) as s:
+            text = genai.GenerativeModel(SUMMARY_MODEL).generate_content(prompt).text.strip()
+            s["summary_chars"] = len(text)
+        return _truncate(text, SUMMARY_TOKEN_BUDGET)
+    except Exception as e:
+        logger.warning(f"Chat history summary failed, keeping the start of each turn instead: {e}")
+        first_lines = [f"{m['role']}: {(message_text(m).splitlines() or [''])[0]}" for m in messages]
+        return _truncate("\n".join(filter(None, [summary] + first_lines)), SUMMARY_TOKEN_BUDGET)
+
+
+def build_chat_history(messages, state) -> list:
+    """
+    Bounded history for the prompt: the last RECENT_TURNS exchanges verbatim as
+    plain {"role", "content"} messages, preceded by a "summary" message covering
+    everything older. The summary is kept in `state` (the Streamlit session
+    state) and only extended when more messages leave the recent window, so
+    reruns and ordinary turns cost no extra LLM call.
+    """
+    recent_count = 2 * RECENT_TURNS
+    older, recent = messages[:-recent_count] if len(messages) > recent_count else [], messages[-recent_count:]
+
+    summary_state = state.get(SUMMARY_STATE_KEY)
+    if summary_state is None or summary_state["covered"] > len(older):
+        # a new chat was started
+        summary_state = {"covered": 0, "text": ""}
+    if len(older) > summary_state["covered"]:
+        summary_state = {"covered": len(older),
+                         "text": _summarize(summary_state["text"], older[summary_state["covered"]:])}
+    state[SUMMARY_STATE_KEY] = summary_state
+
+    history = [{"role": m["role"], "content": _truncate(message_text(m), MESSAGE_TOKEN_LIMIT)} for m in recent]
+    if summary_state["text"]:
+        history.insert(0, {"role": "summary", "content": summary_state["text"]})
+    return history
+
+
+def format_history(chat_history) -> str:
+    """
+    History block of the prompt within HISTORY_TOKEN_BUDGET. Oldest messages
+    are dropped first; payloads are stripped whatever the caller passed in.
+    """
+    lines = [f"{m['role']}: {_truncate(message_text(m), MESSAGE_TOKEN_LIMIT)}" for m in chat_history]
+    while len(lines) > 1 and sum(estimate_tokens(line) for line in lines) > HISTORY_TOKEN_BUDGET:
+        # the running summary stays, the oldest verbatim message goes
+        lines.pop(1 if chat_history[0]["role"] == "summary" and len(lines) > 2 else 0)
+    return "\n".join(lines)
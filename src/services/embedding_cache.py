@@ -0,0 +1,245 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+CACHE_DB_PATH = "data/cache/embeddings.db"
+# entries kept in memory per process
+MEMORY_CACHE_SIZE = 1024
+# entries kept on disk, the least recently used ones are evicted beyond this
+PERSISTENT_CACHE_SIZE = 50000
+# document chunk embeddings kept on disk, comfortably above the size of the library
+CHUNK_CACHE_SIZE = 500000
+# SQLite limits the number of parameters per statement
+SQLITE_BATCH = 500
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive key, so trivial retypes still hit."""
+    return re.sub(r'\s+', ' ', query).strip().casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Query -> embedding cache with a size-bounded in-memory LRU in front of a
+    SQLite table, so entries survive restarts and are shared by every session.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, memory_size=MEMORY_CACHE_SIZE, persistent_size=PERSISTENT_CACHE_SIZE):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.persistent_size = persistent_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_query_last_used ON query_embeddings (last_used)")
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _key(model, task_type, query):
+        return f"{model}|{task_type}|{normalize_query(query)}"
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, model, task_type, query):
+        key = self._key(model, task_type, query)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._memory[key]
+
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT embedding FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            embedding = np.frombuffer(row[0], dtype='float32')
+            self.stats["disk_hits"] += 1
+            self._remember(key, embedding)
+            return embedding
+
+    def peek(self, model, task_type, query):
+        """Like get, but leaves the hit/miss statistics and the LRU order untouched."""
+        key = self._key(model, task_type, query)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT embedding FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else np.frombuffer(row[0], dtype='float32')
+
+    def put(self, model, task_type, query, embedding):
+        key = self._key(model, task_type, query)
+        embedding = np.asarray(embedding, dtype='float32')
+        with self._lock:
+            self._remember(key, embedding)
+            self._writes_since_trim += 1
+            trim = self._writes_since_trim >= 100
+            if trim:
+                self._writes_since_trim = 0
+
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO query_embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                         (key, embedding.tobytes(), time.time()))
+            if trim:
+                conn.execute("""
+                    DELETE FROM query_embeddings WHERE key IN (
+                        SELECT key FROM query_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.persistent_size,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+def chunk_key(model: str, task_type: str, content: str) -> str:
+    """Content address of an embedded text: the exact string sent, including any title prefix."""
+    return hashlib.sha256(f"{model}\0{task_type}\0{content}".encode('utf-8')).hexdigest()
+
+
+class ChunkEmbeddingCache:
+    """
+    Content-addressed store of document chunk embeddings in the same SQLite
+    database, so rebuilds and re-uploads only embed chunks whose text changed.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, max_entries=CHUNK_CACHE_SIZE):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_embeddings (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_last_used ON chunk_embeddings (last_used)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get_many(self, keys) -> dict:
+        """Returns {key: embedding} for the keys that are cached."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        conn = self._connect()
+        try:
+            for i in range(0, len(keys), SQLITE_BATCH):
+                batch = keys[i:i + SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT key, embedding FROM chunk_embeddings WHERE key IN ({placeholders})",
+                                    batch).fetchall()
+                found.update((key, np.frombuffer(blob, dtype='float32')) for key, blob in rows)
+                conn.execute(f"UPDATE chunk_embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                             (time.time(), *batch))
+            conn.commit()
+        finally:
+            conn.close()
+        return found
+
+    def put_many(self, items):
+        """Stores (key, embedding) pairs and evicts the least recently used beyond max_entries."""
+        now = time.time()
+        rows = [(key, np.asarray(embedding, dtype='float32').tobytes(), now) for key, embedding in items]
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO chunk_embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                             rows)
+            conn.execute("""
+                DELETE FROM chunk_embeddings WHERE key IN (
+                    SELECT key FROM chunk_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def cache_table_sizes(db_path=CACHE_DB_PATH) -> dict:
+    """Row count of every table in the cache database (query and chunk embeddings, cached answers)."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        conn.close()
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """Process-wide query embedding cache, created on first use."""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+        return _query_cache
+
+
+_chunk_cache = None
+_chunk_cache_lock = threading.Lock()
+
+
+def get_chunk_cache() -> ChunkEmbeddingCache:
+    """Process-wide chunk embedding cache, created on first use."""
+    global _chunk_cache
+    with _chunk_cache_lock:
+        if _chunk_cache is None:
+            _chunk_cache = ChunkEmbeddingCache()
+        return _chunk_cache
@@ -0,0 +1,194 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from .logger_service import setup_logger
+from .embedding_cache import chunk_key, get_chunk_cache
+
+logger = setup_logger()
+
+EMBEDDING_MODEL = "models/embedding-001"
+BATCH_SIZE = 50
+# embed_content calls allowed per minute by the API quota
+REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "60"))
+MAX_WORKERS = 4
+MAX_RETRIES = 5
+INITIAL_BACKOFF_SECONDS = 10
+MAX_BACKOFF_SECONDS = 120
+
+# errors worth retrying: quota, overload and timeouts
+RATE_LIMIT_ERRORS = (google_exceptions.ResourceExhausted,)
+TRANSIENT_ERRORS = (google_exceptions.ServiceUnavailable, google_exceptions.DeadlineExceeded,
+                    google_exceptions.InternalServerError)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate_per_minute` tokens refill evenly, bursts up to `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: int = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, int(rate_per_minute // 10))
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def gemini_embedder(task_type: str, model: str = EMBEDDING_MODEL):
+    """Default embed function: one embed_content call for a whole batch."""
+    def embed(batch):
+        return genai.embed_content(model=model, content=batch, task_type=task_type)['embedding']
+    return embed
+
+
+class EmbeddingScheduler:
+    """
+    Embeds batches concurrently while staying inside the request budget.
+
+    Every request takes a token from a shared bucket. A ResourceExhausted from any
+    worker pauses all of them (shared exponential backoff) instead of each worker
+    hammering the API on its own. Failed batches are retried up to max_retries
+    times and results are returned in the order the batches were given.
+    `embed_fn` takes a list of texts and returns their vectors, so a local fake
+    can stand in for the API.
+    """
+
+    def __init__(self, embed_fn, requests_per_minute=REQUESTS_PER_MINUTE, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, initial_backoff=INITIAL_BACKOFF_SECONDS,
+                 max_backoff=MAX_BACKOFF_SECONDS, clock=time.monotonic, sleep=time.sleep):
+        self.embed_fn = embed_fn
+        self.bucket = TokenBucket(requests_per_minute, clock=clock, sleep=sleep)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleep = sleep
+        self._backoff_lock = threading.Lock()
+        self._backoff_until = 0.0
+        self._backoff = initial_backoff
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0}
+
+    def _wait_for_backoff(self):
+        while True:
+            with self._backoff_lock:
+                remaining = self._backoff_until - self.clock()
+            if remaining <= 0:
+                return
+            self.sleep(remaining)
+
+    def _register_rate_limit(self):
+        with self._backoff_lock:
+            now = self.clock()
+            # workers hitting the limit during the same pause do not stretch it further
+            if now >= self._backoff_until:
+                self._backoff_until = now + self._backoff
+                logger.warning(f"Embedding rate limit hit, pausing all workers for {self._backoff}s.")
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            self.stats["rate_limited"] += 1
+
+    def _register_success(self):
+        with self._backoff_lock:
+            self._backoff = self.initial_backoff
+
+    def _embed_batch(self, position, batch):
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_backoff()
+            self.bucket.acquire()
+            try:
+                with self._backoff_lock:
+                    self.stats["requests"] += 1
+                embeddings = self.embed_fn(batch)
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Embedder returned {len(embeddings)} vectors for {len(batch)} texts")
+                self._register_success()
+                return embeddings
+            except RATE_LIMIT_ERRORS:
+                self._register_rate_limit()
+                error = "rate limit"
+            except TRANSIENT_ERRORS as e:
+                self.sleep(min(self.initial_backoff * 2 ** attempt, self.max_backoff))
+                error = str(e)
+            if attempt < self.max_retries:
+                with self._backoff_lock:
+                    self.stats["retries"] += 1
+                logger.warning(f"Retrying embedding batch {position} (attempt {attempt + 2}): {error}")
+        raise RuntimeError(f"Embedding batch {position} failed after {self.max_retries + 1} attempts: {error}")
+
+    def embed_batches(self, batches, return_exceptions=False) -> list:
+        """
+        Embeds a list of batches, returning one list of vectors per batch, in order.
+        With return_exceptions a batch that still fails after its retries yields its
+        exception in place instead of aborting the whole run.
+        """
+        if not batches:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            futures = [executor.submit(self._embed_batch, i, batch) for i, batch in enumerate(batches)]
+            if not return_exceptions:
+                try:
+                    return [future.result() for future in futures]
+                except Exception:
+                    # batches that have not started yet are pointless once one failed
+                    for future in futures:
+                        future.cancel()
+                    raise
+            return [future.exception() or future.result() for future in futures]
+
+    def embed_texts(self, texts, batch_size=BATCH_SIZE) -> list:
+        """Splits texts into batches, embeds them concurrently and flattens the result."""
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        return [vector for batch in self.embed_batches(batches) for vector in batch]
+
+
+def embed_with_cache(texts, scheduler, cache=None, model=EMBEDDING_MODEL, task_type="RETRIEVAL_DOCUMENT",
+                     batch_size=BATCH_SIZE, return_exceptions=False):
+    """
+    Embeds texts through the content-addressed chunk cache: only texts never
+    embedded before (by model, task type and exact content) reach the API, and
+    identical texts are sent once. Returns (embeddings, api_count). With
+    return_exceptions, texts whose batch failed get None instead of raising.
+    """
+    cache = cache or get_chunk_cache()
+    keys = [chunk_key(model, task_type, text) for text in texts]
+    found = cache.get_many(keys)
+    missing = list(dict.fromkeys(key for key in keys if key not in found))
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        results = scheduler.embed_batches([[text_by_key[key] for key in batch] for batch in batches],
+                                          return_exceptions=return_exceptions)
+        embedded = [(key, vector) for batch, result in zip(batches, results)
+                    if not isinstance(result, Exception) for key, vector in zip(batch, result)]
+        cache.put_many(embedded)
+        found.update(embedded)
+    return [found.get(key) for key in keys], len(missing)
+
+
+_document_scheduler = None
+_document_scheduler_lock = threading.Lock()
+
+
+def get_document_scheduler() -> EmbeddingScheduler:
+    """Process-wide scheduler for document embeddings, so concurrent ingests share one budget."""
+    global _document_scheduler
+    with _document_scheduler_lock:
+        if _document_scheduler is None:
+            _document_scheduler = EmbeddingScheduler(gemini_embedder("RETRIEVAL_DOCUMENT"))
+        return _document_scheduler
@@ -0,0 +1,93 @@
+import os
+import threading
+
+from .index_manager import load_index as load_metadata_index, METADATA_INDEX_PATH, METADATA_LOG_PATH
+from .vector_store import load_store, VECTOR_STORE_DIR
+from .logger_service import setup_logger
+
+logger = setup_logger()
+
+
+class IndexSnapshot:
+    """An immutable pair of vector store and metadata index, tagged with a generation."""
+
+    def __init__(self, vector_store, metadata_index, generation):
+        self.vector_store = vector_store
+        self.metadata_index = metadata_index
+        self.generation = generation
+
+
+class IndexHolder:
+    """
+    Process-wide holder of the current index snapshot.
+
+    Every call to get() compares a cheap on-disk signature (stat of the manifest,
+    WAL and metadata files) with the one the snapshot was built from. When it
+    changed, one caller rebuilds the snapshot and swaps the reference; everyone
+    else keeps reading the previous snapshot instead of waiting for the reload.
+    Loading is cheap because the vector store is memory-mapped.
+    """
+
+    def __init__(self, store_dir=VECTOR_STORE_DIR):
+        self.store_dir = store_dir
+        self._snapshot = None
+        self._signature = None
+        self._generation = 0
+        self._reload_lock = threading.Lock()
+
+    def _current_signature(self):
+        paths = [METADATA_INDEX_PATH, METADATA_LOG_PATH]
+        if os.path.isdir(self.store_dir):
+            paths += sorted(entry.path for entry in os.scandir(self.store_dir) if entry.is_file())
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def get(self) -> IndexSnapshot:
+        signature = self._current_signature()
+        if self._snapshot is not None and signature == self._signature:
+            return self._snapshot
+
+        # only the very first load makes readers wait, later reloads never do
+        if not self._reload_lock.acquire(blocking=self._snapshot is None):
+            return self._snapshot
+        try:
+            if self._snapshot is None or signature != self._signature:
+                self._reload(signature)
+        finally:
+            self._reload_lock.release()
+        return self._snapshot
+
+    def invalidate(self):
+        """Forces a reload on the next get(), e.g. right after an ingest."""
+        self._signature = None
+
+    def _reload(self, signature):
+        try:
+            vector_store = load_store(self.store_dir)
+        except (FileNotFoundError, IOError, ValueError) as e:
+            # a compaction may have swapped files underneath us, retry on the next call
+            logger.warning(f"Could not load vector store, keeping the previous snapshot: {e}")
+            if self._snapshot is not None:
+                return
+            vector_store = None
+        self._generation += 1
+        self._snapshot = IndexSnapshot(vector_store, load_metadata_index(), self._generation)
+        self._signature = signature
+
+
+_holder = IndexHolder()
+
+
+def get_index_snapshot() -> IndexSnapshot:
+    """Returns the latest index snapshot, shared by every session of this process."""
+    return _holder.get()
+
+
+def invalidate_index_cache():
+    _holder.invalidate()
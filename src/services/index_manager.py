@@ -1,10 +1,19 @@
 import json
 import os
+import threading
 
 METADATA_INDEX_PATH = "data/document_index.json"
+# append-only change log replayed on top of the JSON snapshot
+METADATA_LOG_PATH = "data/document_index.log"
+# number of logged changes after which the log is folded into the snapshot
+LOG_COMPACTION_THRESHOLD = 200
 
-def load_index():
-    """Load the document metadata index"""
+_log_lock = threading.Lock()
+# callbacks(entries, start_offset, end_offset) run after each log write, they keep derived indexes current
+_log_listeners = []
+
+def load_snapshot():
+    """The document index as last compacted into METADATA_INDEX_PATH, without the change log replayed."""
     if not os.path.exists(METADATA_INDEX_PATH):
         return {}
     try:
@@ -14,31 +23,95 @@ def load_index():
         print(f"Error loading index: {e}")
         return {}
 
+def read_log(offset=0):
+    """Change-log entries from byte offset on. Returns (entries, offset just past the last complete one)."""
+    if not os.path.exists(METADATA_LOG_PATH):
+        return [], 0
+    entries = []
+    with open(METADATA_LOG_PATH, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete line")
+                entries.append(json.loads(line))
+            except ValueError:
+                # torn write at the tail, everything before it is valid
+                break
+            offset += len(line)
+    return entries, offset
+
+def _read_log():
+    return read_log()[0]
+
+def add_log_listener(callback):
+    """Registers callback(entries, start_offset, end_offset), called after every change-log write."""
+    _log_listeners.append(callback)
+
+def _append_log(*entries):
+    """Records changes with a single write. Cost is independent of the library size."""
+    os.makedirs(os.path.dirname(METADATA_LOG_PATH), exist_ok=True)
+    with _log_lock:
+        with open(METADATA_LOG_PATH, 'ab') as f:
+            start = f.tell()
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        for callback in _log_listeners:
+            callback(entries, start, end)
+    if len(_read_log()) >= LOG_COMPACTION_THRESHOLD:
+        compact_index()
+
+def load_index():
+    """Load the document metadata index"""
+    index = load_snapshot()
+    for entry in _read_log():
+        if entry.get('op') == 'put':
+            index[entry['key']] = entry['metadata']
+        elif entry.get('op') == 'delete':
+            index.pop(entry['key'], None)
+    return index
+
 def save_index(index_data):
     """Save the document metadata index"""
     os.makedirs(os.path.dirname(METADATA_INDEX_PATH), exist_ok=True)
-    with open(METADATA_INDEX_PATH, 'w', encoding='utf-8') as f:
+    tmp_path = METADATA_INDEX_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(index_data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, METADATA_INDEX_PATH)
+
+def compact_index():
+    """Fold the change log into the JSON snapshot and truncate the log"""
+    with _log_lock:
+        save_index(load_index())
+        if os.path.exists(METADATA_LOG_PATH):
+            os.remove(METADATA_LOG_PATH)
 
 def add_document_to_index(metadata):
     """Add a document to the metadata index"""
     if not metadata.get('file_name'):
         print("Warning: Cannot add document without filename")
         return
-    
-    index = load_index()
+
     key = os.path.splitext(metadata.get('file_name', ''))[0]
-    index[key] = metadata
-    save_index(index)
+    _append_log({"op": "put", "key": key, "metadata": metadata})
     print(f"Added {metadata.get('file_name')} to index")
 
+def add_documents_to_index(metadata_list):
+    """Add several documents to the metadata index in one log write"""
+    entries = [{"op": "put", "key": os.path.splitext(metadata['file_name'])[0], "metadata": metadata}
+               for metadata in metadata_list if metadata.get('file_name')]
+    if entries:
+        _append_log(*entries)
+        print(f"Added {len(entries)} documents to index")
+
 def remove_document_from_index(filename):
     """Remove a document from the metadata index"""
     index = load_index()
     key = os.path.splitext(filename)[0]
     if key in index:
-        del index[key]
-        save_index(index)
+        _append_log({"op": "delete", "key": key})
         print(f"Removed {filename} from index")
     else:
         print(f"Document {filename} not found in index")
@@ -55,6 +128,6 @@ def update_document_metadata(filename, updates):
     key = os.path.splitext(filename)[0]
     if key in index:
         index[key].update(updates)
-        save_index(index)
+        _append_log({"op": "put", "key": key, "metadata": index[key]})
         return True
-    return False
\ No newline at end of file
+    return False
@@ -1,44 +1,70 @@
 import os
-import json
-import time
-import numpy as np
-import faiss
-import google.generativeai as genai
-from google.api_core import exceptions as google_exceptions
 
-from src.document_processing.chunker import chunk_text
+from src.document_processing.chunker import iter_chunks
+from src.document_processing.near_duplicates import collapse_near_duplicates
 from services.logger_service import setup_logger
+from .embedding_service import get_document_scheduler, embed_with_cache
 from .index_manager import load_index as load_metadata_index
+from .vector_store import add_segment, delete_document
+from .index_cache import invalidate_index_cache
+from .answer_cache import invalidate_documents as invalidate_cached_answers
+from .metrics_service import span
 
 logger = setup_logger()
 
-VECTOR_STORE_PATH = "data/vector_store.json"
-FAISS_INDEX_PATH = "data/faiss_index.idx"
 PROCESSED_TEXT_DIR = "data/processed_documents/"
-EMBEDDING_MODEL = "models/embedding-001"
-BATCH_SIZE = 50
 
-def update_vector_store(new_data):
-    if os.path.exists(VECTOR_STORE_PATH) and os.path.getsize(VECTOR_STORE_PATH) > 0:
-        with open(VECTOR_STORE_PATH, 'r', encoding='utf-8') as f:
-            vector_store = json.load(f)
-    else:
-        vector_store = []
-    vector_store.extend(new_data)
-    with open(VECTOR_STORE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(vector_store, f)
+def update_vector_store(new_data, replaces=()):
+    """
+    Appends the new chunks as a delta segment, the existing store is not rewritten.
+    Earlier vectors of the documents in `replaces` are dropped in the same step.
+    """
+    add_segment(
+        embeddings=[item['embedding'] for item in new_data],
+        chunk_texts=[item['chunk_text'] for item in new_data],
+        source_files=[item['source_file'] for item in new_data],
+        replaces=replaces,
+    )
+    invalidate_index_cache()
 
-def update_faiss_index(new_embeddings):
-    new_embeddings_np = np.array(new_embeddings).astype('float32')
-    d = new_embeddings_np.shape[1]
-    if os.path.exists(FAISS_INDEX_PATH):
-        index = faiss.read_index(FAISS_INDEX_PATH)
-    else:
-        index = faiss.IndexFlatL2(d)
-    index.add(new_embeddings_np)
-    faiss.write_index(index, FAISS_INDEX_PATH)
+def remove_document_from_vector_store(source_filename):
+    """Tombstones all chunks of a document so search stops returning them at once."""
+    text_filename = os.path.splitext(source_filename)[0] + ".txt"
+    removed = delete_document(text_filename)
+    invalidate_index_cache()
+    invalidate_cached_answers([text_filename])
+    if removed:
+        logger.info(f"Removed vectors of {source_filename} from the vector store.")
+    return removed
+
+def embed_document_chunks(chunks, doc_title, text_filename):
+    """Embeds the chunks of one document with its title as context. Returns (vector_data, api_count)."""
+    # context enrichment
+    chunks_with_context = [f"Sənədin adı: {doc_title}\n\nMəzmun: {chunk}" for chunk in chunks]
+    embeddings, embedded_count = embed_with_cache(chunks_with_context, get_document_scheduler())
+    vector_data = [
+        {"source_file": text_filename, "chunk_text": chunk, "embedding": embedding}
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+    return vector_data, embedded_count
+
+def commit_documents(vector_data, text_filenames):
+    """
+    Publishes the chunks of one or more documents as a single segment. Earlier
+    vectors of the same documents are replaced and their cached answers dropped.
+    """
+    # a re-upload replaces the previous vectors of the document instead of duplicating them
+    update_vector_store(vector_data, replaces=text_filenames)
+    invalidate_cached_answers(text_filenames)
 
 def process_and_embed_document(source_filename):
+    with span("process_and_embed_document", file=source_filename) as s:
+        success, msg = _process_and_embed_document(source_filename, s)
+        if not success:
+            s["status"] = "error"
+        return success, msg
+
+def _process_and_embed_document(source_filename, s):
     logger.info(f"Starting automated, context-rich indexing for {source_filename}...")
     
     text_filename = os.path.splitext(source_filename)[0] + ".txt"
@@ -53,44 +79,29 @@ def process_and_embed_document(source_filename):
     base_filename = os.path.splitext(source_filename)[0]
     doc_title = metadata_index.get(base_filename, {}).get('title', base_filename.replace('_', ' '))
 
-    with open(text_file_path, 'r', encoding='utf-8') as f:
-        text = f.read()
-
-    chunks = chunk_text(text)
+    # the file is streamed line by line into the chunker
+    with span("index.chunk") as chunk_span, open(text_file_path, 'r', encoding='utf-8') as f:
+        # near-duplicate chunks (repeated headers, boilerplate) are never embedded or indexed
+        chunks, chunk_span["near_duplicates"] = collapse_near_duplicates(iter_chunks(f))
+    s["chunks"] = len(chunks)
     if not chunks:
         return (True, "No chunks to process.")
 
-    # context enrichment
-    chunks_with_context = [f"Sənədin adı: {doc_title}\n\nMəzmun: {chunk}" for chunk in chunks]
-
-    new_vector_data, all_new_embeddings = [], []
     try:
-        for i in range(0, len(chunks), BATCH_SIZE):
-            batch_to_embed = chunks_with_context[i:i + BATCH_SIZE]
-            original_chunks_batch = chunks[i:i + BATCH_SIZE]
-
-            response = genai.embed_content(
-                model=EMBEDDING_MODEL,
-                content=batch_to_embed,
-                task_type="RETRIEVAL_DOCUMENT"
-            )
-            embeddings = response['embedding']
-            all_new_embeddings.extend(embeddings)
-            
-            for j, chunk in enumerate(original_chunks_batch):
-                new_vector_data.append({
-                    "source_file": text_filename, "chunk_text": chunk, "embedding": embeddings[j]
-                })
-            time.sleep(1)
+        with span("index.embed", chunks=len(chunks)) as embed_span:
+            new_vector_data, embedded_count = embed_document_chunks(chunks, doc_title, text_filename)
+            # chunks not sent to the API came from the embedding cache
+            embed_span.update(api_chunks=embedded_count, cached_chunks=len(chunks) - embedded_count)
     except Exception as e:
         msg = f"Gemini API Error: {e}"
         return (False, msg)
             
     if new_vector_data:
-        update_vector_store(new_vector_data)
-        update_faiss_index(all_new_embeddings)
-        msg = f"Successfully indexed {len(chunks)} context-rich chunks from {source_filename}."
+        with span("index.commit", chunks=len(new_vector_data)):
+            commit_documents(new_vector_data, [text_filename])
+        msg = (f"Successfully indexed {len(chunks)} context-rich chunks from {source_filename} "
+               f"({embedded_count} sent to the embedding API, the rest reused from cache).")
         logger.info(msg)
         return (True, msg)
     
-    return (True, "No new data to index.")
\ No newline at end of file
+    return (True, "No new data to index.")
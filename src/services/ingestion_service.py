@@ -0,0 +1,273 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from document_processing.document_parser import ParsedDocument
+from document_processing.metadata_extractor import extract_metadata
+from document_processing.chunker import iter_chunks
+from document_processing.near_duplicates import collapse_near_duplicates
+from .index_manager import add_documents_to_index
+from .indexing_service import embed_document_chunks, commit_documents
+from .logger_service import setup_logger
+from .metrics_service import record_span
+
+logger = setup_logger()
+
+JOBS_DIR = "data/ingestion/jobs"
+PROCESSED_FOLDER = "data/processed_documents"
+METADATA_FOLDER = "data/metadata"
+# processes extracting text and chunking in parallel
+EXTRACT_WORKERS = max(1, min(4, (os.cpu_count() or 1)))
+# documents embedded at the same time, they share the scheduler's request budget
+EMBED_WORKERS = 4
+# files prepared ahead of the embedding stage, bounds the chunks held in memory
+MAX_IN_FLIGHT = 2 * (EXTRACT_WORKERS + EMBED_WORKERS)
+# documents published together as one vector store segment
+COMMIT_BATCH_FILES = 20
+# how long the committer waits for more documents before publishing a partial batch
+COMMIT_WAIT_SECONDS = 2.0
+
+STAGES = ("write", "extract", "metadata", "chunk", "embed", "commit")
+FINAL_STATUSES = ("done", "failed")
+
+
+def _prepare_document(raw_path, processed_path):
+    """
+    Worker process task: parses the file once, writing the text page by page
+    into the processed file and the chunker, and takes the metadata from the
+    same parse. Returns (metadata, chunks, timings).
+    """
+    start = time.perf_counter()
+    with ParsedDocument(raw_path, parallel=False) as doc:
+        # opening parses the file (and builds an xlsx's Parquet cache), so it counts as extraction
+        timings = {"extract": time.perf_counter() - start}
+        # pages go to disk and into the chunker as they are extracted
+        with open(processed_path, "w", encoding="utf-8") as f:
+            def pages():
+                page_start = time.perf_counter()
+                for page_text in doc.pages():
+                    f.write(page_text + "\n")
+                    timings["extract"] += time.perf_counter() - page_start
+                    yield page_text
+                    page_start = time.perf_counter()
+            chunks, _ = collapse_near_duplicates(iter_chunks(pages()))
+        # extraction and chunking are interleaved, the chunker gets the rest of the pass
+        timings["chunk"] = round(time.perf_counter() - start - timings["extract"], 3)
+        timings["extract"] = round(timings["extract"], 3)
+
+        start = time.perf_counter()
+        metadata = extract_metadata(raw_path, parsed=doc)
+        timings["metadata"] = round(time.perf_counter() - start, 3)
+    return metadata, chunks, timings
+
+
+class IngestionQueue:
+    """
+    Background ingestion: uploaded files are queued as a job and go through
+    extraction/chunking in worker processes, concurrent embedding, and batched
+    commits that publish up to COMMIT_BATCH_FILES documents as one segment.
+    Job state is written to JOBS_DIR after every stage, unfinished files are
+    picked up again when the queue starts, and the chunk embedding cache keeps
+    the re-run cheap.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._ready = queue.Queue()
+        self._in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+        self._extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+        self._embed_pool = ThreadPoolExecutor(max_workers=EMBED_WORKERS)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._resume()
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+        threading.Thread(target=self._commit_loop, daemon=True).start()
+
+    # job state
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save_job(self, job):
+        tmp_path = self._job_path(job['id']) + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self._job_path(job['id']))
+
+    def _update_file(self, job_id, index, timings=None, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            entry = job['files'][index]
+            entry.update(changes)
+            if timings:
+                entry['timings'].update(timings)
+                for stage, seconds in timings.items():
+                    record_span(f"ingest.{stage}", seconds * 1000, job=job_id, file=entry['name'])
+            if all(f['status'] in FINAL_STATUSES for f in job['files']):
+                job['finished_at'] = job.get('finished_at') or datetime.now().isoformat(timespec='seconds')
+            self._save_job(job)
+
+    def _resume(self):
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self.jobs_dir, name), 'r', encoding='utf-8') as f:
+                job = json.load(f)
+            self._jobs[job['id']] = job
+            unfinished = [i for i, entry in enumerate(job['files']) if entry['status'] not in FINAL_STATUSES]
+            for index in unfinished:
+                job['files'][index]['status'] = "queued"
+                self._pending.put((job['id'], index))
+            if unfinished:
+                job['finished_at'] = None
+                self._save_job(job)
+                logger.info(f"Resuming ingestion job {job['id']}: {len(unfinished)} unfinished files.")
+
+    def submit(self, files, submitted_by):
+        """
+        Queues already saved files. `files` holds dicts with path, name, team,
+        tags and the time spent writing the upload. Returns the job id.
+        """
+        job = {
+            "id": datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6],
+            "submitted_by": submitted_by,
+            "submitted_at": datetime.now().isoformat(timespec='seconds'),
+            "finished_at": None,
+            "files": [{
+                "name": f['name'], "path": f['path'], "team": f.get('team', "Unassigned"),
+                "tags": f.get('tags', []), "status": "queued", "error": None, "chunks": None,
+                "timings": {"write": round(f.get('write_seconds', 0.0), 3)},
+            } for f in files],
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._save_job(job)
+        for index, entry in enumerate(job['files']):
+            record_span("ingest.write", entry['timings']['write'] * 1000, job=job['id'], file=entry['name'])
+            self._pending.put((job['id'], index))
+        logger.info(f"User '{submitted_by}' queued {len(files)} files as ingestion job {job['id']}.")
+        return job['id']
+
+    def list_jobs(self, limit=10):
+        """Most recent jobs first, as copies safe to render."""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job['id'], reverse=True)[:limit]
+            return json.loads(json.dumps(jobs))
+
+    # pipeline stages
+
+    def _dispatch_loop(self):
+        while True:
+            job_id, index = self._pending.get()
+            self._in_flight.acquire()
+            entry = self._jobs[job_id]['files'][index]
+            base_filename = os.path.splitext(entry['name'])[0]
+            processed_path = os.path.join(PROCESSED_FOLDER, f"{base_filename}.txt")
+            self._update_file(job_id, index, status="extracting")
+            pool = self._extract_pool
+            try:
+                future = pool.submit(_prepare_document, entry['path'], processed_path)
+            except Exception as e:
+                self._fail(job_id, index, e)
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_extract_pool(pool)
+                continue
+            future.add_done_callback(lambda f, job_id=job_id, index=index, pool=pool:
+                                     self._on_prepared(job_id, index, f, pool))
+
+    def _replace_extract_pool(self, broken_pool):
+        # a crashed worker breaks the whole pool, the files after it get a fresh one
+        with self._lock:
+            if self._extract_pool is not broken_pool:
+                return
+            logger.warning("Extraction worker pool broke, starting a new one.")
+            self._extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+        broken_pool.shutdown(wait=False)
+
+    def _fail(self, job_id, index, error):
+        logger.error(f"Ingestion of '{self._jobs[job_id]['files'][index]['name']}' failed: {error}")
+        self._update_file(job_id, index, status="failed", error=str(error))
+        self._in_flight.release()
+
+    def _on_prepared(self, job_id, index, future, pool):
+        try:
+            metadata, chunks, timings = future.result()
+        except Exception as e:
+            self._fail(job_id, index, e)
+            if isinstance(e, BrokenProcessPool):
+                self._replace_extract_pool(pool)
+            return
+        entry = self._jobs[job_id]['files'][index]
+        metadata['team'], metadata['tags'] = entry['team'], entry['tags']
+        self._update_file(job_id, index, timings=timings, status="embedding", chunks=len(chunks))
+        self._embed_pool.submit(self._embed, job_id, index, metadata, chunks)
+
+    def _embed(self, job_id, index, metadata, chunks):
+        entry = self._jobs[job_id]['files'][index]
+        text_filename = os.path.splitext(entry['name'])[0] + ".txt"
+        start = time.perf_counter()
+        try:
+            doc_title = metadata.get('title') or os.path.splitext(entry['name'])[0].replace('_', ' ')
+            vector_data, _ = embed_document_chunks(chunks, doc_title, text_filename) if chunks else ([], 0)
+        except Exception as e:
+            self._fail(job_id, index, f"Gemini API Error: {e}")
+            return
+        self._update_file(job_id, index, timings={"embed": round(time.perf_counter() - start, 3)},
+                          status="committing")
+        self._ready.put((job_id, index, metadata, text_filename, vector_data))
+
+    def _commit_loop(self):
+        while True:
+            batch = [self._ready.get()]
+            deadline = time.monotonic() + COMMIT_WAIT_SECONDS
+            while len(batch) < COMMIT_BATCH_FILES:
+                try:
+                    batch.append(self._ready.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        """Publishes a batch of documents: one metadata log write and one vector store segment."""
+        start = time.perf_counter()
+        try:
+            # vectors first: chunks without a metadata entry are visible to no role, so a failed
+            # vector commit leaves nothing behind and the metadata write below publishes the batch
+            vector_data = [item for *_, items in batch for item in items]
+            if vector_data:
+                commit_documents(vector_data, [text_filename for _, _, _, text_filename, _ in batch])
+            for _, _, metadata, text_filename, _ in batch:
+                base_filename = os.path.splitext(text_filename)[0]
+                with open(os.path.join(METADATA_FOLDER, f"{base_filename}.json"), "w", encoding="utf-8") as f:
+                    json.dump(metadata, f, indent=4)
+            add_documents_to_index([metadata for _, _, metadata, _, _ in batch])
+        except Exception as e:
+            for job_id, index, *_ in batch:
+                self._fail(job_id, index, e)
+            return
+        elapsed = round(time.perf_counter() - start, 3)
+        for job_id, index, *_ in batch:
+            self._update_file(job_id, index, timings={"commit": elapsed}, status="done")
+            self._in_flight.release()
+        logger.info(f"Committed {len(batch)} documents ({len(vector_data)} chunks) in {elapsed}s.")
+
+
+_ingestion_queue = None
+_ingestion_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Process-wide ingestion queue, started (and resumed) on first use."""
+    global _ingestion_queue
+    with _ingestion_queue_lock:
+        if _ingestion_queue is None:
+            _ingestion_queue = IngestionQueue()
+        return _ingestion_queue
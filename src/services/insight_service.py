@@ -1,25 +1,37 @@
+import os
 import google.generativeai as genai
 from .google_client import configure_google_client
 from document_processing.text_extractor import extract_text
 from services.logger_service import setup_logger
+from .metrics_service import span
+from .qa_service import token_usage
 
 logger = setup_logger()
 
+INSIGHT_TEXT_CHARS = 20000
+
 def extract_insights(file_path: str, lang: str):
     """
     Extracts key insights (key points, metrics, dates) from a document.
     Returns a markdown-formatted string on success or an error message on failure.
     """
+    with span("extract_insights", file=os.path.basename(file_path), lang=lang) as s:
+        result = _extract_insights(file_path, lang)
+        if result.startswith(("Error:", "An error occurred")):
+            s["status"] = "error"
+        return result
+
+def _extract_insights(file_path: str, lang: str):
     try:
         configure_google_client()
         
-        full_text = extract_text(file_path)
-        if not full_text or not full_text.strip():
+        # Use a large portion of the text for analysis, pages past it are never parsed
+        with span("insight_text_extraction", file=os.path.basename(file_path)) as s:
+            truncated_text = extract_text(file_path, max_chars=INSIGHT_TEXT_CHARS)
+            s["text_chars"] = len(truncated_text)
+        if not truncated_text or not truncated_text.strip():
             return "Error: Document is empty or text could not be extracted."
 
-        # Use a large portion of the text for analysis
-        truncated_text = full_text[:20000]
-
         if lang == 'az':
             prompt = f"""
             Sən peşəkar bir biznes analitiksən. Sənin vəzifən aşağıdakı sənədin mətnini təhlil etmək və ondan ən vacib məlumatları strukturlaşdırılmış şəkildə çıxarmaqdır.
@@ -54,7 +66,9 @@ def extract_insights(file_path: str, lang: str):
             """
         
         model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
+        with span("insight_generate", model='gemini-2.5-flash', prompt_chars=len(prompt), lang=lang) as s:
+            response = model.generate_content(prompt)
+            s.update(token_usage(response), response_chars=len(response.text))
         
         return response.text
 
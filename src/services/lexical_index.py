@@ -0,0 +1,155 @@
+import json
+import math
+import os
+import re
+import unicodedata
+import numpy as np
+
+LEXICAL_TERMS_FILE = "bm25_terms.json"
+LEXICAL_OFFSETS_FILE = "bm25_offsets.npy"
+LEXICAL_ROWS_FILE = "bm25_rows.npy"
+LEXICAL_TF_FILE = "bm25_tf.npy"
+LEXICAL_LENGTHS_FILE = "bm25_lengths.npy"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Azerbaijani is agglutinative: "kredit", "kreditlər", "kreditlərin" share the
+# first letters, so words are cut to this many characters instead of stemmed
+STEM_PREFIX = 5
+# rank offset of reciprocal-rank fusion, the usual value from the literature
+RRF_K = 60
+# candidates taken from each of the vector and BM25 rankings before fusion
+FUSION_DEPTH = 20
+# share of a question's term weight a BM25 hit must match to join the vector hits
+LEXICAL_MIN_COVERAGE = 0.5
+
+# diacritic variants people type interchangeably; PDFs also use the Cyrillic schwa
+_AZ_FOLD = str.maketrans({"ə": "e", "ә": "e", "ş": "s", "ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ü": "u"})
+# numbers keep their separators, so dates, article numbers and amounts stay one token
+_TOKEN_PATTERN = re.compile(r"\d+(?:[.,/:-]\d+)*|[^\W\d_]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lower-cases and folds Azerbaijani letters and other diacritics to plain Latin ones."""
+    text = text.replace("İ", "i").replace("Ә", "ə").casefold().translate(_AZ_FOLD)
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list:
+    """Index terms of a text: numbers as written, words cut to STEM_PREFIX characters."""
+    return [token if token[0].isdigit() else token[:STEM_PREFIX]
+            for token in _TOKEN_PATTERN.findall(normalize_text(text))]
+
+
+def exact_terms(terms) -> list:
+    """Terms only an exact match can find: numbers, dates, article and account numbers."""
+    return [term for term in terms if term[0].isdigit()]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunks of one segment. Terms map to a slice of
+    the postings arrays (row, term frequency), rows are ascending inside a slice.
+    """
+
+    def __init__(self, terms, offsets, rows, tfs, lengths):
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.lengths = lengths
+        self.total_length = int(np.asarray(lengths, dtype='int64').sum())
+
+    def __len__(self):
+        return int(self.lengths.shape[0])
+
+    def document_frequency(self, term) -> int:
+        i = self.term_ids.get(term)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def postings(self, term):
+        """(rows, term frequencies) of the chunks containing term, None if no chunk does."""
+        i = self.term_ids.get(term)
+        if i is None:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return np.asarray(self.rows[start:end]), np.asarray(self.tfs[start:end], dtype='float32')
+
+    def score(self, idf, avg_length, excluded=None):
+        """
+        BM25 score of every row for the query terms in idf ({term: idf}), plus the
+        share of the query's idf each row matches (1.0 = contains every term).
+        """
+        scores = np.zeros(len(self), dtype='float32')
+        matched = np.zeros(len(self), dtype='float32')
+        length_norm = None
+        for term, weight in idf.items():
+            postings = self.postings(term)
+            if postings is None:
+                continue
+            if length_norm is None:
+                length_norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(self.lengths, dtype='float32') / avg_length)
+            rows, tfs = postings
+            scores[rows] += weight * tfs * (BM25_K1 + 1) / (tfs + length_norm[rows])
+            matched[rows] += weight
+        if excluded is not None:
+            scores[excluded] = 0
+        total = sum(idf.values())
+        return scores, matched / total if total else matched
+
+
+def build_lexical_index(chunk_texts) -> LexicalIndex:
+    postings = {}
+    lengths = np.zeros(len(chunk_texts), dtype='int32')
+    for row, text in enumerate(chunk_texts):
+        counts = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        lengths[row] = sum(counts.values())
+        for term, count in counts.items():
+            postings.setdefault(term, []).append((row, count))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+    entries = [entry for term in terms for entry in postings[term]]
+    rows = np.array([row for row, _ in entries], dtype='int32')
+    tfs = np.array([min(count, 65535) for _, count in entries], dtype='uint16')
+    return LexicalIndex(terms, offsets, rows, tfs, lengths)
+
+
+def write_lexical_index(index: LexicalIndex, segment_dir: str):
+    terms = sorted(index.term_ids, key=index.term_ids.get)
+    with open(os.path.join(segment_dir, LEXICAL_TERMS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(terms, f, ensure_ascii=False)
+    np.save(os.path.join(segment_dir, LEXICAL_OFFSETS_FILE), index.offsets)
+    np.save(os.path.join(segment_dir, LEXICAL_ROWS_FILE), index.rows)
+    np.save(os.path.join(segment_dir, LEXICAL_TF_FILE), index.tfs)
+    np.save(os.path.join(segment_dir, LEXICAL_LENGTHS_FILE), index.lengths)
+
+
+def read_lexical_index(segment_dir: str):
+    """Opens a segment's postings memory-mapped. Returns None for segments written without one."""
+    terms_path = os.path.join(segment_dir, LEXICAL_TERMS_FILE)
+    if not os.path.exists(terms_path):
+        return None
+    with open(terms_path, 'r', encoding='utf-8') as f:
+        terms = json.load(f)
+    load = lambda name: np.load(os.path.join(segment_dir, name), mmap_mode='r')
+    return LexicalIndex(terms, load(LEXICAL_OFFSETS_FILE), load(LEXICAL_ROWS_FILE), load(LEXICAL_TF_FILE),
+                        load(LEXICAL_LENGTHS_FILE))
+
+
+def bm25_idf(document_frequency, total_documents) -> float:
+    return math.log(1 + (total_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def reciprocal_rank_fusion(*rankings) -> list:
+    """Merges ranked lists of ids: each id scores sum(1 / (RRF_K + rank)), best first as (id, score)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(fused.items(), key=lambda entry: -entry[1])
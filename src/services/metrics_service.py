@@ -0,0 +1,121 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import numpy as np
+
+METRICS_FILE = "logs/metrics.jsonl"
+# the file is rotated to METRICS_FILE + ".1" beyond this size
+METRICS_MAX_BYTES = 20 * 1024 * 1024
+# spans read back for the admin summary, newest first
+SUMMARY_MAX_SPANS = 50000
+
+_write_lock = threading.Lock()
+# (trace id, span id) of the span the current code runs in
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _write(record):
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    os.makedirs(os.path.dirname(METRICS_FILE), exist_ok=True)
+    with _write_lock:
+        try:
+            if os.path.getsize(METRICS_FILE) > METRICS_MAX_BYTES:
+                os.replace(METRICS_FILE, METRICS_FILE + ".1")
+        except FileNotFoundError:
+            pass
+        with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def record_span(name, duration_ms, **attributes):
+    """Writes one finished span, e.g. a stage timed elsewhere, under the current trace if there is one."""
+    parent = _current_span.get()
+    attributes.setdefault("status", "ok")
+    try:
+        _write(dict(attributes, ts=round(time.time(), 3), span=name, ms=round(duration_ms, 3),
+                    trace=parent[0] if parent else uuid.uuid4().hex[:12], parent=parent[1] if parent else None))
+    except OSError:
+        pass
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a block and writes it as one JSON line to METRICS_FILE. Spans opened
+    inside it share its trace id, so one chat turn can be followed stage by stage.
+    The yielded dict takes extra attributes (token counts, cache hits, sizes):
+
+        with span("semantic_search", top_k=5) as s:
+            ...
+            s["results"] = len(results)
+    """
+    parent = _current_span.get()
+    trace_id = parent[0] if parent else uuid.uuid4().hex[:12]
+    span_id = uuid.uuid4().hex[:8]
+    token = _current_span.set((trace_id, span_id))
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _current_span.reset(token)
+        try:
+            # a block can mark itself failed with attributes["status"] = "error" without raising
+            status = status if status == "error" else attributes.pop("status", status)
+            _write(dict(attributes, ts=round(time.time(), 3), span=name, ms=round(duration_ms, 3),
+                        trace=trace_id, id=span_id, parent=parent[1] if parent else None, status=status))
+        except OSError:
+            # metrics must never break the request they measure
+            pass
+
+
+def load_spans(since_seconds=None, limit=SUMMARY_MAX_SPANS):
+    """The most recent spans (up to limit) from the metrics file, oldest first."""
+    if not os.path.exists(METRICS_FILE):
+        return []
+    with open(METRICS_FILE, 'r', encoding='utf-8') as f:
+        lines = f.readlines()[-limit:]
+    cutoff = time.time() - since_seconds if since_seconds else 0
+    spans = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get('ts', 0) >= cutoff:
+            spans.append(record)
+    return spans
+
+
+def summarize_spans(spans):
+    """Per stage: count, errors, p50/p95/max latency and, where recorded, cache hit rate and mean tokens."""
+    by_name = {}
+    for record in spans:
+        by_name.setdefault(record['span'], []).append(record)
+    summary = []
+    for name, records in sorted(by_name.items()):
+        durations = np.array([record['ms'] for record in records])
+        row = {
+            "stage": name, "count": len(records),
+            "errors": sum(record.get('status') == "error" for record in records),
+            "p50_ms": round(float(np.percentile(durations, 50)), 1),
+            "p95_ms": round(float(np.percentile(durations, 95)), 1),
+            "max_ms": round(float(durations.max()), 1),
+        }
+        cache_flags = [record['cache_hit'] for record in records if 'cache_hit' in record]
+        if cache_flags:
+            row["cache_hit_rate"] = round(sum(cache_flags) / len(cache_flags), 3)
+        for key in ("prompt_tokens", "output_tokens"):
+            values = [record[key] for record in records if record.get(key) is not None]
+            if values:
+                row[f"mean_{key}"] = round(float(np.mean(values)), 1)
+        summary.append(row)
+    return summary
@@ -1,34 +1,34 @@
 import google.generativeai as genai
 import json
+import time
 from .google_client import configure_google_client
+from .answer_cache import lookup_answer, store_answer, is_cacheable
+from .metrics_service import span, record_span
+from .chat_history import format_history
 from services.logger_service import setup_logger
 
 logger = setup_logger()
 
-def get_answer_from_llm(query: str, context_chunks: list, chat_history: list) -> str:
-    """
-    Generates a structured JSON response containing a text answer and an optional
-    chart suggestion based on the context and chat history.
-    """
-    configure_google_client()
-    
-    if not context_chunks:
-        error_response = {"answer_text": "Sənədlərdə bu suala cavab vermək üçün uyğun məlumat tapılmadı.", "chart_info": None, "source_filename": None}
-        return json.dumps(error_response)
+# separates the streamed answer text from the trailing source/chart JSON block
+ANSWER_META_MARKER = "<<<ANSWER_META>>>"
 
-    context_string = "\n\n---\n\n".join(context_chunks)
-    history_string = "\n".join([f"{m['role']}: {m['content']}" for m in chat_history])
+def token_usage(response) -> dict:
+    """Prompt and output token counts reported by Gemini, None when the response has no usage data."""
+    usage = getattr(response, "usage_metadata", None)
+    return {"prompt_tokens": getattr(usage, "prompt_token_count", None),
+            "output_tokens": getattr(usage, "candidates_token_count", None)}
 
-    # YENİLƏNMİŞ PROMPT
-    prompt = f"""
+def _prompt(query, context_chunks, history_string, response_format):
+    """The instructions, chat history, context and question both answer modes share, then response_format."""
+    context_string = "\n\n---\n\n".join(context_chunks)
+    return f"""
     You are an expert data analyst. Your task is to answer the user's LATEST QUESTION based on the provided CONTEXT.
     The CONTEXT contains chunks of text, each prefixed with its source file like "[Source: filename.pdf]".
-    You MUST respond with a single, valid JSON object with THREE keys: "answer_text", "chart_info", and "source_filename".
 
-    1.  **"answer_text"**: - Write a helpful, synthesized text answer in the same language as the user's question.
-                           - **Detect the language of the "LATEST QUESTION" and ALWAYS respond in that same language.**
-                           - If the question is in Azerbaijani, answer in Azerbaijani. If it's in English, answer in English.
-    
+    1.  **The answer**: - Write a helpful, synthesized text answer in the same language as the user's question.
+                        - **Detect the language of the "LATEST QUESTION" and ALWAYS respond in that same language.**
+                        - If the question is in Azerbaijani, answer in Azerbaijani. If it's in English, answer in English.
+
     2.  **"source_filename"**: - From the CONTEXT DOCUMENTS, identify the single, primary source file (e.g., "filename.pdf") you used to construct the answer.
                              - The value for this key MUST be the exact filename string from the context. If no specific source is used, this should be null.
 
@@ -44,18 +44,215 @@ def get_answer_from_llm(query: str, context_chunks: list, chat_history: list) ->
 
     LATEST QUESTION:
     {query}
+    {response_format}"""
+
+_JSON_FORMAT = """
+    You MUST respond with a single, valid JSON object with THREE keys: "answer_text" (the answer), "chart_info", and "source_filename".
 
     JSON RESPONSE:
     """
+
+_STREAMING_FORMAT = f"""
+    First write the answer itself as plain markdown text (NOT JSON).
+    After the answer, write a new line containing only {ANSWER_META_MARKER} followed by a single, valid JSON object with TWO keys: "source_filename" and "chart_info".
+    Write nothing after the JSON object.
+
+    ANSWER:
+    """
+
+def get_answer_from_llm(query: str, context_chunks: list, chat_history: list,
+                        query_embedding=None, chunk_ids=None, user_role=None, source_files=()) -> str:
+    """
+    Generates a structured JSON response containing a text answer and an optional
+    chart suggestion based on the context and chat history.
+    When the query embedding, retrieved chunk ids and role are given, a semantically
+    equivalent earlier question over the same chunks is answered from the cache.
+    """
+    with span("get_answer_from_llm", query_chars=len(query), context_chunks=len(context_chunks)) as s:
+        response = _answer_from_llm(query, context_chunks, chat_history, query_embedding, chunk_ids,
+                                    user_role, source_files)
+        s["response_chars"] = len(response)
+        return response
+
+def _answer_from_llm(query, context_chunks, chat_history, query_embedding, chunk_ids, user_role, source_files) -> str:
+    use_cache = query_embedding is not None and bool(chunk_ids) and bool(user_role)
+    # the history is part of the cache key, so follow-ups are never answered from another conversation
+    history_string = format_history(chat_history)
+    if use_cache:
+        with span("answer_cache_lookup") as s:
+            cached_response = lookup_answer(query_embedding, chunk_ids, user_role, history_string)
+            s["cache_hit"] = cached_response is not None
+        if cached_response is not None:
+            return cached_response
+
+    configure_google_client()
+    
+    if not context_chunks:
+        error_response = {"answer_text": "Sənədlərdə bu suala cavab vermək üçün uyğun məlumat tapılmadı.", "chart_info": None, "source_filename": None}
+        return json.dumps(error_response)
+
+    prompt = _prompt(query, context_chunks, history_string, _JSON_FORMAT)
     try:
         model = genai.GenerativeModel('gemini-1.5-flash')
         generation_config = genai.types.GenerationConfig(
             temperature=0.1,
             response_mime_type="application/json"
         )
-        response = model.generate_content(prompt, generation_config=generation_config)
+        with span("llm_generate", model='gemini-1.5-flash', prompt_chars=len(prompt),
+                  context_chunks=len(context_chunks), history_messages=len(chat_history)) as s:
+            response = model.generate_content(prompt, generation_config=generation_config)
+            s.update(token_usage(response), response_chars=len(response.text))
+        if use_cache and is_cacheable(response.text):
+            store_answer(query_embedding, chunk_ids, user_role, source_files, response.text, history_string)
         return response.text
     except Exception as e:
         logger.error(f"An error occurred while generating JSON answer: {e}")
         error_response = {"answer_text": f"An error occurred while generating the answer: {e}", "chart_info": None, "source_filename": None}
-        return json.dumps(error_response)
\ No newline at end of file
+        return json.dumps(error_response)
+
+
+class AnswerStream:
+    """
+    Iterating yields the answer text as Gemini generates it, ready for
+    st.write_stream. Once the iteration is over, `result` holds the same dict as
+    a parsed get_answer_from_llm response (answer_text, chart_info, source_filename).
+    """
+
+    def __init__(self, query, context_chunks, chat_history, query_embedding=None, chunk_ids=None,
+                 user_role=None, source_files=()):
+        self.query = query
+        self.context_chunks = context_chunks
+        self.chat_history = chat_history
+        self.query_embedding = query_embedding
+        self.chunk_ids = chunk_ids
+        self.user_role = user_role
+        self.source_files = source_files
+        self.use_cache = query_embedding is not None and bool(chunk_ids) and bool(user_role)
+        self.history_string = format_history(chat_history)
+        self.result = None
+
+    def __iter__(self):
+        if self.use_cache:
+            with span("answer_cache_lookup") as s:
+                cached_response = lookup_answer(self.query_embedding, self.chunk_ids, self.user_role,
+                                                self.history_string)
+                s["cache_hit"] = cached_response is not None
+            if cached_response is not None:
+                self.result = json.loads(cached_response)
+                yield self.result["answer_text"]
+                return
+
+        if not self.context_chunks:
+            self.result = {"answer_text": "Sənədlərdə bu suala cavab vermək üçün uyğun məlumat tapılmadı.", "chart_info": None, "source_filename": None}
+            yield self.result["answer_text"]
+            return
+
+        configure_google_client()
+        prompt = _prompt(self.query, self.context_chunks, self.history_string, _STREAMING_FORMAT)
+        start = time.perf_counter()
+        first_token_ms = None
+        answer_parts, meta_text = [], None
+        try:
+            model = genai.GenerativeModel('gemini-1.5-flash')
+            generation_config = genai.types.GenerationConfig(temperature=0.1)
+            response = model.generate_content(prompt, generation_config=generation_config, stream=True)
+            for piece in _split_answer_stream(_response_text(response)):
+                if isinstance(piece, _Meta):
+                    meta_text = piece.text
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                answer_parts.append(piece)
+                yield piece
+            usage = token_usage(response)
+        except Exception as e:
+            logger.error(f"An error occurred while streaming the answer: {e}")
+            message = f"An error occurred while generating the answer: {e}"
+            self.result = {"answer_text": "".join(answer_parts) + ("\n\n" if answer_parts else "") + message,
+                           "chart_info": None, "source_filename": None}
+            yield ("\n\n" if answer_parts else "") + message
+            record_span("llm_stream", (time.perf_counter() - start) * 1000, status="error",
+                        first_token_ms=first_token_ms, prompt_chars=len(prompt))
+            return
+
+        meta = _parse_meta(meta_text)
+        self.result = {"answer_text": "".join(answer_parts).strip(), "chart_info": meta.get("chart_info"),
+                       "source_filename": meta.get("source_filename")}
+        record_span("llm_stream", (time.perf_counter() - start) * 1000, model='gemini-1.5-flash',
+                    first_token_ms=round(first_token_ms, 3) if first_token_ms is not None else None,
+                    prompt_chars=len(prompt), context_chunks=len(self.context_chunks),
+                    response_chars=len(self.result["answer_text"]), meta_found=meta_text is not None, **usage)
+        response_json = json.dumps(self.result, ensure_ascii=False)
+        if self.use_cache and is_cacheable(response_json):
+            store_answer(self.query_embedding, self.chunk_ids, self.user_role, self.source_files, response_json,
+                         self.history_string)
+
+
+def stream_answer_from_llm(query: str, context_chunks: list, chat_history: list,
+                           query_embedding=None, chunk_ids=None, user_role=None, source_files=()) -> AnswerStream:
+    """
+    Streaming counterpart of get_answer_from_llm: the answer text is shown while
+    it is generated, source_filename and chart_info follow in a trailing block
+    after ANSWER_META_MARKER and are available as `.result` at the end.
+    """
+    return AnswerStream(query, context_chunks, chat_history, query_embedding, chunk_ids, user_role, source_files)
+
+
+class _Meta:
+    def __init__(self, text):
+        self.text = text
+
+
+def _response_text(response):
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # a chunk without text parts, e.g. only a finish reason
+            continue
+        if text:
+            yield text
+
+
+def _split_answer_stream(pieces):
+    """
+    Passes answer text through as it arrives and returns everything after
+    ANSWER_META_MARKER as one trailing _Meta. A tail that could be the start of
+    the marker is held back until the next piece shows whether it is.
+    """
+    buffer = ""
+    meta_parts = None
+    for piece in pieces:
+        if meta_parts is not None:
+            meta_parts.append(piece)
+            continue
+        buffer += piece
+        position = buffer.find(ANSWER_META_MARKER)
+        if position >= 0:
+            if buffer[:position]:
+                yield buffer[:position]
+            meta_parts = [buffer[position + len(ANSWER_META_MARKER):]]
+            buffer = ""
+            continue
+        held = next((n for n in range(min(len(buffer), len(ANSWER_META_MARKER) - 1), 0, -1)
+                     if buffer.endswith(ANSWER_META_MARKER[:n])), 0)
+        if len(buffer) > held:
+            yield buffer[:len(buffer) - held]
+            buffer = buffer[len(buffer) - held:]
+    if buffer:
+        yield buffer
+    if meta_parts is not None:
+        yield _Meta("".join(meta_parts))
+
+
+def _parse_meta(meta_text) -> dict:
+    if not meta_text:
+        return {}
+    # models sometimes wrap the block in a code fence
+    meta_text = meta_text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        meta = json.loads(meta_text)
+    except json.JSONDecodeError:
+        logger.warning("Streamed answer had an unreadable source/chart block.")
+        return {}
+    return meta if isinstance(meta, dict) else {}
@@ -0,0 +1,90 @@
+import numpy as np
+
+from .lexical_index import tokenize, exact_terms, reciprocal_rank_fusion, LEXICAL_MIN_COVERAGE
+from .vector_store import mmr_select
+
+# chunks containing every term of an exact-term question that make the embedding unnecessary
+LEXICAL_ONLY_MIN_HITS = 2
+# BM25 coverage of a chunk containing every query term
+_FULL_COVERAGE = 1.0 - 1e-6
+
+# Ranking steps shared by semantic_search and the offline retrieval benchmark. They
+# only read the vector store, so neither Gemini nor the metrics log is touched here.
+
+
+def lexical_candidates(vector_store, query, depth, allowed_sources):
+    """BM25 rows and their query coverage, best first, plus {row: BM25 score}."""
+    lexical_scores, lexical_rows, coverage = vector_store.lexical_search(query, depth, allowed_sources)
+    return lexical_rows, coverage, {int(row): float(score) for row, score in zip(lexical_rows, lexical_scores)}
+
+
+def lexical_only_rows(vector_store, query, lexical_rows, coverage, lexical_scores, top_k):
+    """
+    The rows answering an exact-term question without its embedding: top_k of the
+    chunks containing every query term, if there are enough of them. None when the
+    question needs the vector search.
+    """
+    full_matches = [int(row) for row, c in zip(lexical_rows, coverage) if c >= _FULL_COVERAGE]
+    if not exact_terms(tokenize(query)) or len(full_matches) < min(top_k, LEXICAL_ONLY_MIN_HITS):
+        return None
+    return diversify(vector_store, [(row, lexical_scores[row]) for row in full_matches], top_k)
+
+
+def vector_hits(vector_store, query_vector, depth, allowed_sources, min_score, k=None):
+    """Up to depth rows with distinct chunk texts by cosine similarity, and their scores."""
+    # widen k only if duplicates ate into it
+    k = k or depth
+    while True:
+        scores, indices = vector_store.search(query_vector, k=k, allowed_sources=allowed_sources)
+        rows, row_scores, complete = distinct_hits(vector_store, scores[0], indices[0], depth, min_score)
+        if complete:
+            return rows, row_scores
+        k *= 2
+
+
+def distinct_hits(vector_store, scores, indices, depth, min_score):
+    """
+    Rows of one query's ranked hits with distinct chunk texts, up to depth, and
+    {row: score}. complete is False when duplicates left fewer than depth rows
+    although a larger k could still find more.
+    """
+    rows, row_scores, seen_chunks = [], {}, set()
+    for score, original_index in zip(scores, indices):
+        if original_index < 0 or (min_score is not None and score < min_score):
+            return rows, row_scores, True
+        chunk_text = vector_store.chunk_text(original_index)
+        if chunk_text in seen_chunks:
+            continue
+        seen_chunks.add(chunk_text)
+        rows.append(int(original_index))
+        row_scores[int(original_index)] = float(score)
+        if len(rows) >= depth:
+            return rows, row_scores, True
+    return rows, row_scores, len(indices) == 0 or indices[-1] < 0
+
+
+def fused_rows(vector_store, vector_rows, lexical_rows, coverage, top_k) -> list:
+    """Up to top_k rows of the vector and BM25 rankings merged by reciprocal-rank fusion."""
+    # without a relevant vector hit only chunks containing every query term may still answer it
+    min_coverage = LEXICAL_MIN_COVERAGE if vector_rows else _FULL_COVERAGE
+    lexical_ranking = [int(row) for row, c in zip(lexical_rows, coverage) if c >= min_coverage]
+    return diversify(vector_store, reciprocal_rank_fusion(vector_rows, lexical_ranking), top_k)
+
+
+def diversify(vector_store, ranked, top_k) -> list:
+    """
+    Rows of the distinct chunk texts among the ranked (row, relevance) pairs; when
+    there are more than top_k, MMR over their stored embeddings picks top_k that
+    are relevant but not near-copies of each other.
+    """
+    rows, relevance, seen_chunks = [], [], set()
+    for row, score in ranked:
+        chunk_text = vector_store.chunk_text(row)
+        if chunk_text not in seen_chunks:
+            seen_chunks.add(chunk_text)
+            rows.append(row)
+            relevance.append(score)
+    if len(rows) <= top_k:
+        return rows
+    embeddings = np.stack([vector_store.embedding(row) for row in rows])
+    return [rows[i] for i in mmr_select(np.asarray(relevance) / max(relevance), embeddings, top_k)]
@@ -0,0 +1,84 @@
+import os
+import time
+import numpy as np
+
+from .lexical_index import tokenize
+from .metrics_service import span
+
+# "0" sends the search results to the LLM in retrieval order, without reranking
+RERANK_RESULTS = os.getenv("RERANK_RESULTS", "1") != "0"
+# candidates retrieved for the reranker to choose from
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "10"))
+# at most this many chunks reach the prompt
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+# chunks scoring below this share of the best one are dropped
+RERANK_MIN_RATIO = float(os.getenv("RERANK_MIN_RATIO", "0.8"))
+# candidates not scored within this time keep their retrieval order after the scored ones
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "30"))
+
+# weights of cosine similarity, query-term coverage and query-phrase (adjacent term pair) coverage
+VECTOR_WEIGHT = 0.6
+TERM_WEIGHT = 0.3
+PHRASE_WEIGHT = 0.1
+
+
+def rerank_scores(query: str, chunk_texts: list, vector_scores=None, budget_ms: float = RERANK_BUDGET_MS):
+    """
+    Scores candidates by a weighted sum of their cosine similarity and their
+    overlap with the question's terms and adjacent term pairs. Term weights are
+    idf-like over the candidate set, so a rare term (a date, an article number)
+    counts more than a common one. Candidates not tokenized within budget_ms
+    get NaN. Without vector scores (BM25-only hits) only the overlap is used.
+    """
+    start = time.perf_counter()
+    query_tokens = tokenize(query)
+    query_terms = list(dict.fromkeys(query_tokens))
+    query_pairs = set(zip(query_tokens, query_tokens[1:]))
+    term_sets, pair_sets = [], []
+    for text in chunk_texts:
+        if term_sets and (time.perf_counter() - start) * 1000 > budget_ms:
+            break
+        terms = tokenize(text)
+        term_sets.append(set(terms))
+        pair_sets.append(set(zip(terms, terms[1:])) & query_pairs)
+
+    scores = np.full(len(chunk_texts), np.nan, dtype='float32')
+    scored = len(term_sets)
+    if not query_terms:
+        term_coverage = np.zeros(scored, dtype='float32')
+    else:
+        incidence = np.array([[term in terms for term in query_terms] for terms in term_sets], dtype='float32')
+        weights = 1.0 + np.log((scored + 1) / (incidence.sum(axis=0) + 1))
+        term_coverage = incidence @ weights / weights.sum()
+    phrase_coverage = np.array([len(pairs) / len(query_pairs) if query_pairs else 0.0 for pairs in pair_sets],
+                               dtype='float32')
+
+    vectors = None if vector_scores is None else np.array(
+        [np.nan if s is None else s for s in vector_scores[:scored]], dtype='float32')
+    if vectors is None or np.isnan(vectors).all():
+        scores[:scored] = (TERM_WEIGHT * term_coverage + PHRASE_WEIGHT * phrase_coverage) / (TERM_WEIGHT + PHRASE_WEIGHT)
+    else:
+        scores[:scored] = VECTOR_WEIGHT * np.nan_to_num(vectors, nan=np.nanmin(vectors)) + \
+            TERM_WEIGHT * term_coverage + PHRASE_WEIGHT * phrase_coverage
+    return scores
+
+
+def rerank_results(query: str, results: list, top_n: int = RERANK_TOP_N, min_ratio: float = RERANK_MIN_RATIO,
+                   budget_ms: float = RERANK_BUDGET_MS) -> list:
+    """
+    Reorders semantic_search results by rerank_scores and cuts them down to the
+    top_n chunks scoring at least min_ratio of the best one, so fewer and
+    better chunks go into the prompt. Each kept result gets a "rerank_score".
+    """
+    if len(results) <= 1:
+        return results
+    with span("rerank", candidates=len(results), budget_ms=budget_ms) as s:
+        scores = rerank_scores(query, [item['chunk_text'] for item in results],
+                               [item.get('score') for item in results], budget_ms)
+        scored = int((~np.isnan(scores)).sum())
+        # unscored candidates keep their retrieval order behind the scored ones
+        order = list(np.argsort(-scores[:scored], kind='stable')) + list(range(scored, len(results)))
+        best = float(scores[order[0]])
+        kept = [i for i in order[:top_n] if np.isnan(scores[i]) or scores[i] >= min_ratio * best]
+        s.update(scored=scored, kept=len(kept), budget_exhausted=scored < len(results))
+    return [dict(results[i], rerank_score=None if np.isnan(scores[i]) else float(scores[i])) for i in kept]
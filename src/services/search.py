@@ -1,71 +1,210 @@
-import json
 import numpy as np
-import faiss
 import google.generativeai as genai
 import os
 
-from .access_control import get_accessible_documents
+from .access_control import get_accessible_source_files
 from .google_client import configure_google_client
-from .index_manager import load_index as load_metadata_index
+from .index_cache import get_index_snapshot
+from .embedding_cache import get_query_cache
+from .metrics_service import span
+from .lexical_index import FUSION_DEPTH
+from .ranking import lexical_candidates, lexical_only_rows, vector_hits, distinct_hits, fused_rows
+from .vector_store import normalize_rows
 
-VECTOR_STORE_PATH = "data/vector_store.json"
-FAISS_INDEX_PATH = "data/faiss_index.idx"
 EMBEDDING_MODEL = "models/embedding-001"
+# cosine similarity below which a chunk is not considered relevant to the question
+MIN_RELEVANCE_SCORE = 0.5
+# queries per embed_content request when embedding a batch
+QUERY_BATCH_SIZE = 100
 
-# load resources
-try:
-    configure_google_client()
-    index = faiss.read_index(FAISS_INDEX_PATH)
-    with open(VECTOR_STORE_PATH, 'r', encoding='utf-8') as f:
-        vector_store = json.load(f)
-    metadata_index = load_metadata_index()
-except (FileNotFoundError, IOError):
+configure_google_client()
+if get_index_snapshot().vector_store is None:
     print("WARNING: Search index files not found. Search will not work.")
-    index, vector_store, metadata_index = None, None, None
 
-def semantic_search(query: str, user_role: str, top_k: int = 5, temp_index=None, temp_vector_store=None) -> list:
-    if temp_index and temp_vector_store:
-        index_to_search=temp_index
-        store_to_use=temp_vector_store
-    if not all([index, vector_store, metadata_index]):
+def get_query_embedding(query: str) -> np.ndarray:
+    """Embeds a search query, answering repeated questions from the local cache."""
+    cache = get_query_cache()
+    with span("query_embedding", query_chars=len(query)) as s:
+        embedding = cache.get(EMBEDDING_MODEL, "RETRIEVAL_QUERY", query)
+        s["cache_hit"] = embedding is not None
+        if embedding is None:
+            embedding = genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=query,
+                task_type="RETRIEVAL_QUERY"
+            )['embedding']
+            cache.put(EMBEDDING_MODEL, "RETRIEVAL_QUERY", query, embedding)
+    return np.asarray(embedding, dtype='float32')
+
+def get_query_embeddings(queries: list) -> np.ndarray:
+    """
+    Embeds many search queries as an (n, d) matrix. Cached ones come from the
+    local cache, the rest are sent in one embed_content call per QUERY_BATCH_SIZE.
+    """
+    cache = get_query_cache()
+    with span("query_embedding_batch", queries=len(queries)) as s:
+        embeddings = [cache.get(EMBEDDING_MODEL, "RETRIEVAL_QUERY", query) for query in queries]
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        s["cache_hits"] = len(queries) - sum(embedding is None for embedding in embeddings)
+        computed = {}
+        for start in range(0, len(missing), QUERY_BATCH_SIZE):
+            batch = missing[start:start + QUERY_BATCH_SIZE]
+            vectors = genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=batch,
+                task_type="RETRIEVAL_QUERY"
+            )['embedding']
+            for query, vector in zip(batch, vectors):
+                computed[query] = vector
+                cache.put(EMBEDDING_MODEL, "RETRIEVAL_QUERY", query, vector)
+        s["api_calls"] = -(-len(missing) // QUERY_BATCH_SIZE)
+    return np.asarray([computed[query] if embedding is None else embedding
+                       for query, embedding in zip(queries, embeddings)], dtype='float32')
+
+def cached_query_embedding(query: str):
+    """
+    The query's embedding if it has been computed before, None otherwise. Never
+    calls the API and is not counted in the cache statistics, semantic_search
+    already recorded this query's hit or miss.
+    """
+    embedding = get_query_cache().peek(EMBEDDING_MODEL, "RETRIEVAL_QUERY", query)
+    return None if embedding is None else np.asarray(embedding, dtype='float32')
+
+def semantic_search(query: str, user_role: str, top_k: int = 5, temp_index=None, temp_vector_store=None,
+                    min_score: float = None) -> list:
+    """
+    Returns up to top_k chunks the role may read, best first, each with its cosine
+    similarity in "score" and its BM25 score in "lexical_score" (None when only
+    one ranking found it). Vector hits and BM25 hits are merged by reciprocal-rank
+    fusion, so article numbers, dates and diacritic variants are found even when
+    the embedding misses them. Vector hits below min_score are left out, so an
+    off-topic question can come back empty and skip the LLM call. Exact-term
+    questions answered by the BM25 index alone skip the query embedding and
+    have "score" None.
+    """
+    with span("semantic_search", top_k=top_k) as s:
+        results = _semantic_search(query, user_role, top_k, min_score)
+        s["results"] = len(results)
+        s["top_score"] = results[0]["score"] if results else None
+        s["lexical_only"] = bool(results) and results[0]["score"] is None
+        s["context_chars"] = sum(len(item["chunk_text"]) for item in results)
+        return results
+
+def _semantic_search(query, user_role, top_k, min_score) -> list:
+    # one consistent snapshot per query, newer uploads show up on the next one
+    snapshot = get_index_snapshot()
+    vector_store, metadata_index = snapshot.vector_store, snapshot.metadata_index
+    if not vector_store or not metadata_index:
         return []
 
-    accessible_docs_metadata = get_accessible_documents(user_role)
-    accessible_source_files = {os.path.splitext(doc['file_name'])[0] for doc in accessible_docs_metadata}
-    
+    accessible_source_files = _accessible_source_files(user_role)
+    if not accessible_source_files:
+        return []
+
+    depth = max(FUSION_DEPTH, 2 * top_k)
+    lexical_rows, coverage, lexical_hits = _lexical_hits(vector_store, query, depth, accessible_source_files)
+
+    # an exact-term question whose terms all occur in enough chunks needs no query embedding
+    rows = lexical_only_rows(vector_store, query, lexical_rows, coverage, lexical_hits, top_k)
+    if rows is not None:
+        return _results(vector_store, metadata_index, rows, lexical_hits, {}, None)
+
     # generate embedding for the user query
-    query_embedding = genai.embed_content(
-        model=EMBEDDING_MODEL,
-        content=query,
-        task_type="RETRIEVAL_QUERY"
-    )['embedding']
-    
-    query_vector = np.array([query_embedding]).astype('float32')
-
-    # search the FAISS index
-    distances, indices = index.search(query_vector, k=top_k * 5)
-
-    # format and filter results
+    query_vector = get_query_embedding(query)[None, :]
+    vector_rows, vector_scores = _vector_hits(vector_store, query_vector, depth, accessible_source_files, min_score)
+    rows = fused_rows(vector_store, vector_rows, lexical_rows, coverage, top_k)
+    return _results(vector_store, metadata_index, rows, lexical_hits, vector_scores, query_vector)
+
+def semantic_search_batch(queries: list, user_role: str, top_k: int = 5, min_score: float = None) -> list:
+    """
+    semantic_search for many queries at once, for offline evaluation, query
+    expansion or cache warming. Query embeddings missing from the cache are
+    fetched in one embed_content call, the role's chunk mask is built once and
+    every query is scored by a single matrix search. Returns one result list
+    per query, the same semantic_search returns; exact-term queries answered
+    by the BM25 index alone are not embedded at all.
+    """
+    with span("semantic_search_batch", queries=len(queries), top_k=top_k) as s:
+        results = _semantic_search_batch(list(queries), user_role, top_k, min_score)
+        s["results"] = sum(len(items) for items in results)
+        return results
+
+def _semantic_search_batch(queries, user_role, top_k, min_score) -> list:
+    snapshot = get_index_snapshot()
+    vector_store, metadata_index = snapshot.vector_store, snapshot.metadata_index
+    if not queries or not vector_store or not metadata_index:
+        return [[] for _ in queries]
+
+    accessible_source_files = _accessible_source_files(user_role)
+    if not accessible_source_files:
+        return [[] for _ in queries]
+
+    depth = max(FUSION_DEPTH, 2 * top_k)
+    lexical = [_lexical_hits(vector_store, query, depth, accessible_source_files) for query in queries]
+    # the BM25-only shortcut of semantic_search, these queries need no embedding
+    shortcuts = [lexical_only_rows(vector_store, query, lexical_rows, coverage, lexical_hits, top_k)
+                 for query, (lexical_rows, coverage, lexical_hits) in zip(queries, lexical)]
+    embedded = [i for i, rows in enumerate(shortcuts) if rows is None]
+    if embedded:
+        query_vectors = get_query_embeddings([queries[i] for i in embedded])
+        with span("vector_search", k=depth, queries=len(embedded), store_chunks=len(vector_store)):
+            scores, indices = vector_store.search(query_vectors, k=depth, allowed_sources=accessible_source_files)
+
+    results, j = [], -1
+    for (lexical_rows, coverage, lexical_hits), shortcut in zip(lexical, shortcuts):
+        if shortcut is not None:
+            results.append(_results(vector_store, metadata_index, shortcut, lexical_hits, {}, None))
+            continue
+        j += 1
+        query_vector = query_vectors[j:j + 1]
+        vector_rows, vector_scores, complete = distinct_hits(vector_store, scores[j], indices[j], depth, min_score)
+        if not complete:
+            # duplicates ate into this query's hits, it alone is searched again with a wider k
+            vector_rows, vector_scores = _vector_hits(vector_store, query_vector, depth, accessible_source_files,
+                                                      min_score, k=2 * depth)
+        rows = fused_rows(vector_store, vector_rows, lexical_rows, coverage, top_k)
+        results.append(_results(vector_store, metadata_index, rows, lexical_hits, vector_scores, query_vector))
+    return results
+
+def _accessible_source_files(user_role) -> frozenset:
+    with span("rbac_filter", role=user_role) as rbac:
+        # precomputed per role, so this is a lookup and the vector store's row masks are reused
+        accessible_source_files = get_accessible_source_files(user_role)
+        rbac["documents"] = len(accessible_source_files)
+    return accessible_source_files
+
+def _lexical_hits(vector_store, query, depth, accessible_source_files):
+    with span("lexical_search", k=depth) as lexical:
+        lexical_rows, coverage, hits = lexical_candidates(vector_store, query, depth, accessible_source_files)
+        lexical["hits"] = len(lexical_rows)
+        lexical["full_matches"] = int((coverage >= 1.0 - 1e-6).sum())
+    return lexical_rows, coverage, hits
+
+def _vector_hits(vector_store, query_vector, depth, accessible_source_files, min_score, k=None):
+    with span("vector_search", k=k or depth, store_chunks=len(vector_store)) as s:
+        rows, row_scores = vector_hits(vector_store, query_vector, depth, accessible_source_files, min_score, k)
+        s["hits"] = len(rows)
+    return rows, row_scores
+
+def _results(vector_store, metadata_index, rows, lexical_hits, vector_scores, query_vector) -> list:
     results = []
-    seen_chunks = set()
-    for i in range(len(indices[0])):
-        original_index = indices[0][i]
-        chunk_data = vector_store[original_index]
-        base_filename = os.path.splitext(chunk_data['source_file'])[0]
-
-        # RBAC check and duplicate chunk check
-        if base_filename in accessible_source_files and chunk_data['chunk_text'] not in seen_chunks:
-
-            original_metadata = metadata_index.get(base_filename, {})
-            
-            results.append({
-                "chunk_text": chunk_data['chunk_text'],
-                "original_filename": original_metadata.get('file_name', 'Unknown'),
-                "original_filepath": original_metadata.get('file_path', ''),
-                "title": original_metadata.get('title', base_filename)
-            })
-            seen_chunks.add(chunk_data['chunk_text'])
-            if len(results) >= top_k:
-                break
-                
-    return results
\ No newline at end of file
+    for original_index in rows:
+        chunk_text = vector_store.chunk_text(original_index)
+        base_filename = os.path.splitext(vector_store.source_file(original_index))[0]
+        original_metadata = metadata_index.get(base_filename, {})
+        score = vector_scores.get(original_index)
+        if score is None and query_vector is not None:
+            # a lexical-only hit, scored the same way as the vector hits
+            score = float(vector_store.embedding(original_index) @ normalize_rows(query_vector)[0])
+
+        results.append({
+            "chunk_id": vector_store.chunk_id(original_index),
+            "source_file": vector_store.source_file(original_index),
+            "chunk_text": chunk_text,
+            "score": score,
+            "lexical_score": lexical_hits.get(original_index),
+            "original_filename": original_metadata.get('file_name', 'Unknown'),
+            "original_filepath": original_metadata.get('file_path', ''),
+            "title": original_metadata.get('title', base_filename)
+        })
+    return results
@@ -0,0 +1,619 @@
+import json
+import os
+import shutil
+import threading
+import numpy as np
+
+from .logger_service import setup_logger
+from .ann_index import (build_index, read_index, write_index, search_index, index_mode as ann_index_mode,
+                        refine_exact, DEFAULT_INDEX_MODE, MIN_ANN_ROWS, PQ_REFINE_FACTOR)
+from .lexical_index import build_lexical_index, write_lexical_index, read_lexical_index, tokenize, bm25_idf
+
+logger = setup_logger()
+
+VECTOR_STORE_DIR = "data/vector_store"
+SEGMENTS_DIR = "segments"
+MANIFEST_FILE = "manifest.json"
+
+EMBEDDINGS_FILE = "embeddings.npy"
+OFFSETS_FILE = "offsets.npy"
+TEXTS_FILE = "texts.bin"
+SOURCE_IDS_FILE = "source_ids.npy"
+SOURCES_FILE = "sources.json"
+IDS_FILE = "ids.npy"
+ANN_INDEX_FILE = "index.faiss"
+
+# rows scored per step, keeps the temporary score matrix small for huge stores
+SEARCH_BLOCK_ROWS = 65536
+# number of segments that triggers a background merge
+COMPACTION_THRESHOLD = 8
+# share of deleted chunks that triggers a background merge
+TOMBSTONE_COMPACTION_RATIO = 0.2
+# weight of redundancy against relevance in maximal-marginal-relevance selection
+MMR_DIVERSITY = 0.3
+# permission sets whose per-segment row masks a store keeps, one per role in practice
+MASK_CACHE_SIZE = 8
+
+# serializes writers (ingest, compaction) inside this process, readers never take it
+_write_lock = threading.Lock()
+_compaction_thread = None
+
+
+class Segment:
+    """
+    Immutable columnar chunk segment backed by memory-mapped files.
+
+    Embeddings are a float32 (n, d) matrix, chunk texts are a single UTF-8 blob
+    addressed by an int64 offsets array and every chunk points to its source file
+    through a small int32 id. Each row also carries a stable int64 chunk id that
+    survives compaction. Nothing is parsed on open, pages are read lazily.
+    """
+
+    def __init__(self, name, embeddings, offsets, texts, source_ids, sources, ids, ann_index=None, directory=None):
+        self.name = name
+        self.directory = directory
+        self.embeddings = embeddings
+        self.offsets = offsets
+        self.texts = texts
+        self.source_ids = source_ids
+        self.sources = sources
+        self.ids = ids
+        # optional FAISS index (HNSW / IVF) keyed by chunk id, exact search is used without it
+        self.ann_index = ann_index
+        # rows whose chunk id has been tombstoned, filled in by VectorStore
+        self.deleted = np.zeros(len(ids), dtype=bool)
+        self._lexical_index = None
+
+    def __len__(self):
+        return int(self.embeddings.shape[0])
+
+    def chunk_text(self, row: int) -> str:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.texts[start:end]).decode('utf-8')
+
+    def source_file(self, row: int) -> str:
+        return self.sources[int(self.source_ids[row])]
+
+    def search(self, queries, k, excluded):
+        if self.ann_index is None:
+            return _flat_search(self.embeddings, queries, k, excluded=excluded)
+        refine = ann_index_mode(self.ann_index) == "ivf_pq"
+        fetch = k * PQ_REFINE_FACTOR if refine else k
+        # hand FAISS whichever id list is shorter
+        if excluded.sum() > len(self) // 2:
+            scores, ids = search_index(self.ann_index, queries, fetch, allowed_ids=np.asarray(self.ids)[~excluded])
+        else:
+            scores, ids = search_index(self.ann_index, queries, fetch, excluded_ids=np.asarray(self.ids)[excluded])
+        # ids are ascending inside a segment, so rows are found by bisection
+        rows = np.where(ids >= 0, np.searchsorted(np.asarray(self.ids), ids), -1).astype('int64')
+        if refine:
+            return refine_exact(queries, rows, self.embeddings, k)
+        scores = np.where(ids >= 0, scores, -np.inf).astype('float32')
+        return scores, rows
+
+    @property
+    def lexical_index(self):
+        """The segment's BM25 postings, opened on first use."""
+        if self._lexical_index is None:
+            index = read_lexical_index(self.directory) if self.directory else None
+            if index is None:
+                # segments written before the lexical index existed get one in memory until the next compaction
+                index = build_lexical_index([self.chunk_text(row) for row in range(len(self))])
+            self._lexical_index = index
+        return self._lexical_index
+
+    def source_mask(self, allowed_sources) -> np.ndarray:
+        """Per-chunk boolean mask of rows whose source file is in allowed_sources."""
+        allowed_ids = [i for i, source_file in enumerate(self.sources) if source_file in allowed_sources]
+        if len(allowed_ids) == len(self.sources):
+            return np.ones(len(self), dtype=bool)
+        return np.isin(np.asarray(self.source_ids), allowed_ids)
+
+
+class VectorStore:
+    """
+    Read-only view over the base segment and every delta segment added since
+    the last compaction. Rows are numbered across segments in manifest order.
+    Tombstoned chunks stay on disk until compaction but are never returned.
+    """
+
+    def __init__(self, segments, tombstones=()):
+        self.segments = [segment for segment in segments if len(segment)]
+        self._starts = np.cumsum([0] + [len(segment) for segment in self.segments])
+        for segment in self.segments:
+            segment.deleted = _in_ranges(np.asarray(segment.ids), tombstones)
+        self._mask_cache = {}
+
+    def __len__(self):
+        return int(self._starts[-1])
+
+    @property
+    def dim(self):
+        return int(self.segments[0].embeddings.shape[1]) if self.segments else 0
+
+    def _locate(self, row):
+        position = int(np.searchsorted(self._starts, row, side='right')) - 1
+        return self.segments[position], int(row - self._starts[position])
+
+    def chunk_text(self, row: int) -> str:
+        segment, local_row = self._locate(row)
+        return segment.chunk_text(local_row)
+
+    def source_file(self, row: int) -> str:
+        segment, local_row = self._locate(row)
+        return segment.source_file(local_row)
+
+    def chunk_id(self, row: int) -> int:
+        segment, local_row = self._locate(row)
+        return int(segment.ids[local_row])
+
+    def embedding(self, row: int) -> np.ndarray:
+        segment, local_row = self._locate(row)
+        return np.asarray(segment.embeddings[local_row], dtype='float32')
+
+    def excluded_rows(self, allowed_sources=None) -> list:
+        """
+        Per segment, the boolean mask of rows no search may return: tombstoned,
+        or (with allowed_sources) from another source file. Memoized for the
+        last MASK_CACHE_SIZE permission sets, so vector and BM25 search, and every
+        query of a batch, share one mask.
+        """
+        key = None if allowed_sources is None else frozenset(allowed_sources)
+        masks = self._mask_cache.get(key)
+        if masks is None:
+            masks = [segment.deleted if key is None else segment.deleted | ~segment.source_mask(key)
+                     for segment in self.segments]
+            if len(self._mask_cache) >= MASK_CACHE_SIZE:
+                self._mask_cache.pop(next(iter(self._mask_cache)), None)
+            self._mask_cache[key] = masks
+        return masks
+
+    def search(self, query_vectors, k: int, allowed_sources=None):
+        """
+        Cosine similarity search over all live chunks. Stored vectors are unit
+        length, so this is a plain inner product once the queries are normalized.
+        When allowed_sources is given, only chunks of those source files are
+        ranked, so k permitted hits come back whenever that many exist.
+        Returns (scores, rows) shaped (n_queries, k), best first, padded with -inf / -1.
+        """
+        queries = np.ascontiguousarray(query_vectors, dtype='float32')
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        queries = normalize_rows(queries)
+        best_scores = np.full((queries.shape[0], k), -np.inf, dtype='float32')
+        best_rows = np.full((queries.shape[0], k), -1, dtype='int64')
+        for segment, start, excluded in zip(self.segments, self._starts, self.excluded_rows(allowed_sources)):
+            if excluded.all():
+                continue
+            scores, rows = segment.search(queries, k, excluded)
+            rows = np.where(rows >= 0, rows + start, -1)
+            best_scores, best_rows = _merge_top_k(best_scores, best_rows, scores, rows, k)
+        return best_scores, best_rows
+
+    def lexical_search(self, query: str, k: int, allowed_sources=None):
+        """
+        BM25 ranking of live chunks for the query text, with term statistics taken
+        over all segments. Returns (scores, rows, coverage) for up to k matching
+        chunks, best first; coverage is the share of the query's idf a chunk
+        matches, 1.0 when it contains every query term.
+        """
+        terms = set(tokenize(query))
+        indexes = [segment.lexical_index for segment in self.segments]
+        total = sum(len(index) for index in indexes)
+        empty = np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+        if not terms or not total:
+            return empty
+        frequencies = {term: sum(index.document_frequency(term) for index in indexes) for term in terms}
+        if not any(frequencies.values()):
+            return empty
+        # terms found nowhere still count against coverage
+        idf = {term: bm25_idf(df, total) for term, df in frequencies.items()}
+        avg_length = max(sum(index.total_length for index in indexes) / total, 1.0)
+
+        all_scores, all_rows, all_coverage = [empty[0]], [empty[1]], [empty[2]]
+        for index, start, excluded in zip(indexes, self._starts, self.excluded_rows(allowed_sources)):
+            if excluded.all():
+                continue
+            scores, coverage = index.score(idf, avg_length, excluded)
+            rows = np.flatnonzero(scores > 0)
+            if len(rows) > k:
+                rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+            all_scores.append(scores[rows])
+            all_rows.append(rows + start)
+            all_coverage.append(coverage[rows])
+        scores, rows, coverage = np.concatenate(all_scores), np.concatenate(all_rows), np.concatenate(all_coverage)
+        top = np.argsort(-scores, kind='stable')[:k]
+        return scores[top], rows[top].astype('int64'), coverage[top]
+
+
+def normalize_rows(vectors):
+    """Scales every row to unit L2 norm in one vectorized pass (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype='float32')
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def mmr_select(relevance, embeddings, k: int, diversity: float = MMR_DIVERSITY) -> list:
+    """
+    Maximal marginal relevance: greedily picks k candidates, each time the one
+    maximizing (1 - diversity) * relevance - diversity * its highest cosine
+    similarity to the candidates already picked, so near-identical chunks do not
+    fill the result. Returns candidate positions in pick order.
+    """
+    relevance = np.asarray(relevance, dtype='float32')
+    if len(relevance) <= 1:
+        return list(range(len(relevance)))
+    vectors = normalize_rows(embeddings)
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(relevance)):
+        gain = (1 - diversity) * relevance - diversity * redundancy
+        gain[selected] = -np.inf
+        selected.append(int(np.argmax(gain)))
+        redundancy = np.maximum(redundancy, similarity[selected[-1]])
+    return selected
+
+
+def _merge_top_k(scores_a, rows_a, scores_b, rows_b, k):
+    all_scores = np.concatenate([scores_a, scores_b], axis=1)
+    all_rows = np.concatenate([rows_a, rows_b], axis=1)
+    top = np.argsort(-all_scores, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(all_scores, top, axis=1), np.take_along_axis(all_rows, top, axis=1)
+
+
+def _in_ranges(ids, ranges):
+    """Vectorized membership test of ids in a list of half-open [start, end) ranges."""
+    if not len(ranges):
+        return np.zeros(len(ids), dtype=bool)
+    ranges = np.array(sorted(ranges), dtype='int64')
+    position = np.searchsorted(ranges[:, 0], ids, side='right') - 1
+    return (position >= 0) & (ids < ranges[np.maximum(position, 0), 1])
+
+
+def _document_ranges(source_files, first_id):
+    """Chunk-id ranges per source file for chunks numbered from first_id."""
+    ranges = {}
+    run_start = 0
+    for i in range(1, len(source_files) + 1):
+        if i == len(source_files) or source_files[i] != source_files[run_start]:
+            ranges.setdefault(source_files[run_start], []).append([first_id + run_start, first_id + i])
+            run_start = i
+    return ranges
+
+
+def _flat_search(matrix, queries, k, excluded=None):
+    n_queries = queries.shape[0]
+    best_scores = np.full((n_queries, k), -np.inf, dtype='float32')
+    best_rows = np.full((n_queries, k), -1, dtype='int64')
+
+    for start in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype='float32')
+        scores = queries @ block.T
+        if excluded is not None:
+            scores[:, excluded[start:start + block.shape[0]]] = -np.inf
+        rows = np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)
+
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_rows = np.concatenate([best_rows, rows], axis=1)
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, top, axis=1)
+        best_rows = np.take_along_axis(all_rows, top, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    best_rows[np.isneginf(best_scores)] = -1
+    return best_scores, best_rows
+
+
+def _mmap_bytes(path):
+    # np.memmap refuses zero-length files
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def load_segment(segment_dir: str) -> Segment:
+    ann_index_path = os.path.join(segment_dir, ANN_INDEX_FILE)
+    with open(os.path.join(segment_dir, SOURCES_FILE), 'r', encoding='utf-8') as f:
+        sources = json.load(f)
+    return Segment(
+        name=os.path.basename(segment_dir),
+        embeddings=np.load(os.path.join(segment_dir, EMBEDDINGS_FILE), mmap_mode='r'),
+        offsets=np.load(os.path.join(segment_dir, OFFSETS_FILE), mmap_mode='r'),
+        texts=_mmap_bytes(os.path.join(segment_dir, TEXTS_FILE)),
+        source_ids=np.load(os.path.join(segment_dir, SOURCE_IDS_FILE), mmap_mode='r'),
+        sources=sources,
+        ids=np.load(os.path.join(segment_dir, IDS_FILE), mmap_mode='r'),
+        ann_index=read_index(ann_index_path) if os.path.exists(ann_index_path) else None,
+        directory=segment_dir,
+    )
+
+
+def write_segment(segment_dir: str, embeddings, chunk_texts, source_files, chunk_ids,
+                  index_mode: str = DEFAULT_INDEX_MODE):
+    """
+    Writes a new immutable segment. Files go to a temporary directory that is
+    renamed into place, so a crash never leaves a half-written segment behind.
+    Embeddings are L2-normalized here, once, so search is a plain inner product.
+    An ANN index is only built for segments of at least MIN_ANN_ROWS chunks,
+    the BM25 postings for lexical search always.
+    """
+    embeddings = np.ascontiguousarray(normalize_rows(embeddings))
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(chunk_texts) or len(chunk_texts) != len(source_files):
+        raise ValueError("embeddings, chunk_texts and source_files must have the same length")
+
+    sources, source_ids = [], np.empty(len(source_files), dtype='int32')
+    source_positions = {}
+    for i, source_file in enumerate(source_files):
+        if source_file not in source_positions:
+            source_positions[source_file] = len(sources)
+            sources.append(source_file)
+        source_ids[i] = source_positions[source_file]
+
+    encoded = [text.encode('utf-8') for text in chunk_texts]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    tmp_dir = segment_dir.rstrip('/') + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), embeddings)
+    np.save(os.path.join(tmp_dir, OFFSETS_FILE), offsets)
+    np.save(os.path.join(tmp_dir, SOURCE_IDS_FILE), source_ids)
+    np.save(os.path.join(tmp_dir, IDS_FILE), np.asarray(chunk_ids, dtype='int64'))
+    if index_mode != "flat" and len(embeddings) >= MIN_ANN_ROWS:
+        write_index(build_index(embeddings, chunk_ids, index_mode), os.path.join(tmp_dir, ANN_INDEX_FILE))
+    write_lexical_index(build_lexical_index(chunk_texts), tmp_dir)
+    with open(os.path.join(tmp_dir, TEXTS_FILE), 'wb') as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(tmp_dir, SOURCES_FILE), 'w', encoding='utf-8') as f:
+        json.dump(sources, f, ensure_ascii=False)
+    os.rename(tmp_dir, segment_dir)
+
+
+# --- manifest and write-ahead log ---
+#
+# manifest.json is the last checkpoint: the segments that existed when it was
+# written and the WAL file that records every change made after it. Ingest only
+# ever appends one line to the WAL, compaction writes a new manifest.
+
+def _read_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def _read_wal(store_dir, wal_name):
+    path = os.path.join(store_dir, wal_name)
+    if not os.path.exists(path):
+        return []
+    ops = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                ops.append(json.loads(line))
+            except json.JSONDecodeError:
+                # torn write at the tail, everything before it is valid
+                break
+    return ops
+
+
+def _append_wal(store_dir, wal_name, op):
+    with open(os.path.join(store_dir, wal_name), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(op, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_state(store_dir):
+    """Replays the WAL on top of the manifest. Returns None for a missing store."""
+    manifest = _read_manifest(store_dir)
+    if manifest is None:
+        return None
+    state = {
+        "segments": list(manifest['segments']),
+        "wal": manifest['wal'],
+        "next_segment": manifest.get('next_segment', 1),
+        "next_chunk_id": manifest.get('next_chunk_id', 0),
+        "index_mode": manifest.get('index_mode', DEFAULT_INDEX_MODE),
+        # source file -> list of [start, end) chunk-id ranges that are live
+        "documents": {k: list(v) for k, v in manifest.get('documents', {}).items()},
+        # [start, end) chunk-id ranges deleted but not yet compacted away
+        "tombstones": list(manifest.get('tombstones', [])),
+    }
+    for op in _read_wal(store_dir, manifest['wal']):
+        if op.get('op') == 'add_segment':
+            for source_file in op.get('replaces', []):
+                state['tombstones'].extend(state['documents'].pop(source_file, []))
+            state['segments'].append(op['segment'])
+            state['next_segment'] = max(state['next_segment'], _segment_number(op['segment']) + 1)
+            state['next_chunk_id'] = max(state['next_chunk_id'], op['next_chunk_id'])
+            for source_file, ranges in op['documents'].items():
+                state['documents'].setdefault(source_file, []).extend(ranges)
+        elif op.get('op') == 'delete_document':
+            state['tombstones'].extend(state['documents'].pop(op['source_file'], []))
+    return state
+
+
+def _checkpoint(state, segments, wal_name, next_segment, tombstones):
+    return {"segments": segments, "wal": wal_name, "next_segment": next_segment,
+            "next_chunk_id": state['next_chunk_id'], "index_mode": state.get('index_mode', DEFAULT_INDEX_MODE),
+            "documents": state['documents'], "tombstones": tombstones}
+
+
+def _segment_number(name):
+    return int(name.split('-')[-1])
+
+
+def _segment_name(number):
+    return f"seg-{number:06d}"
+
+
+def _wal_name(number):
+    return f"wal-{number:06d}.jsonl"
+
+
+def load_store(store_dir: str = VECTOR_STORE_DIR):
+    """Open the store read-only. Returns None if it has not been built yet."""
+    state = _read_state(store_dir)
+    if state is None:
+        return None
+    segments_root = os.path.join(store_dir, SEGMENTS_DIR)
+    return VectorStore([load_segment(os.path.join(segments_root, name)) for name in state['segments']],
+                       state['tombstones'])
+
+
+def write_store(embeddings, chunk_texts, source_files, store_dir: str = VECTOR_STORE_DIR,
+                index_mode: str = DEFAULT_INDEX_MODE):
+    """Replaces the whole store with a single base segment (full rebuild)."""
+    with _write_lock:
+        state = _read_state(store_dir)
+        number = state['next_segment'] if state else 1
+        first_id = state['next_chunk_id'] if state else 0
+        name = _segment_name(number)
+        os.makedirs(os.path.join(store_dir, SEGMENTS_DIR), exist_ok=True)
+        write_segment(os.path.join(store_dir, SEGMENTS_DIR, name), embeddings, chunk_texts, source_files,
+                      np.arange(first_id, first_id + len(chunk_texts)), index_mode)
+        wal_name = _wal_name(number)
+        open(os.path.join(store_dir, wal_name), 'w').close()
+        new_state = {"next_chunk_id": first_id + len(chunk_texts), "index_mode": index_mode,
+                     "documents": _document_ranges(list(source_files), first_id)}
+        _write_manifest(store_dir, _checkpoint(new_state, [name], wal_name, number + 1, []))
+    if state:
+        _remove_files(store_dir, state['segments'], state['wal'])
+
+
+def add_segment(embeddings, chunk_texts, source_files, store_dir: str = VECTOR_STORE_DIR, replaces=()):
+    """
+    Adds chunks as a new delta segment. Cost depends only on the number of new
+    chunks: one segment is written and one line is appended to the WAL.
+    Documents listed in `replaces` are tombstoned by that same WAL line, so a
+    re-uploaded document swaps its vectors atomically instead of piling up copies.
+    """
+    if not len(chunk_texts):
+        return
+    with _write_lock:
+        state = _read_state(store_dir)
+        if state is None:
+            os.makedirs(os.path.join(store_dir, SEGMENTS_DIR), exist_ok=True)
+            _write_manifest(store_dir, _checkpoint({"next_chunk_id": 0, "documents": {}}, [], _wal_name(1), 1, []))
+            state = _read_state(store_dir)
+        name = _segment_name(state['next_segment'])
+        first_id = state['next_chunk_id']
+        # delta segments get the store's index type, not only the ones compaction writes
+        write_segment(os.path.join(store_dir, SEGMENTS_DIR, name), embeddings, chunk_texts, source_files,
+                      np.arange(first_id, first_id + len(chunk_texts)), state.get('index_mode', DEFAULT_INDEX_MODE))
+        replaced = [source_file for source_file in replaces if source_file in state['documents']]
+        _append_wal(store_dir, state['wal'], {
+            "op": "add_segment", "segment": name, "next_chunk_id": first_id + len(chunk_texts),
+            "documents": _document_ranges(list(source_files), first_id), "replaces": replaced,
+        })
+        segment_count = len(state['segments']) + 1
+        replaced_rows = sum(end - start for source_file in replaced for start, end in state['documents'][source_file])
+        dead = sum(end - start for start, end in state['tombstones']) + replaced_rows
+        live = sum(end - start for ranges in state['documents'].values() for start, end in ranges) - \
+            replaced_rows + len(chunk_texts)
+    if segment_count > COMPACTION_THRESHOLD or dead / (dead + live) > TOMBSTONE_COMPACTION_RATIO:
+        compact_in_background(store_dir)
+
+
+def delete_document(source_file: str, store_dir: str = VECTOR_STORE_DIR) -> bool:
+    """
+    Tombstones every chunk of a document. Search skips them immediately, the
+    space is reclaimed by the next compaction.
+    """
+    with _write_lock:
+        state = _read_state(store_dir)
+        if state is None or source_file not in state['documents']:
+            return False
+        _append_wal(store_dir, state['wal'], {"op": "delete_document", "source_file": source_file})
+        dead = sum(end - start for start, end in state['tombstones'] + state['documents'][source_file])
+        live = sum(end - start for ranges in state['documents'].values() for start, end in ranges) - \
+            sum(end - start for start, end in state['documents'][source_file])
+    if dead and dead / (dead + live) > TOMBSTONE_COMPACTION_RATIO:
+        compact_in_background(store_dir)
+    return True
+
+
+def compact(store_dir: str = VECTOR_STORE_DIR, index_mode: str = None):
+    """
+    Merges all segments into one and drops tombstoned chunks. A fresh WAL is
+    started before merging, so ingest and deletes keep running and are replayed
+    on top of the merged segment, whose chunk ids are unchanged.
+    Passing index_mode switches the store to that index type and always rebuilds.
+    """
+    with _write_lock:
+        state = _read_state(store_dir)
+        mode_change = index_mode is not None and index_mode != state['index_mode'] if state else False
+        if state is None or (len(state['segments']) < 2 and not state['tombstones'] and not mode_change):
+            return False
+        if index_mode is not None:
+            state['index_mode'] = index_mode
+        to_merge = state['segments']
+        merged_name = _segment_name(state['next_segment'])
+        new_wal = _wal_name(state['next_segment'])
+        open(os.path.join(store_dir, new_wal), 'w').close()
+        _write_manifest(store_dir, _checkpoint(state, to_merge, new_wal, state['next_segment'] + 1,
+                                               state['tombstones']))
+
+    segments_root = os.path.join(store_dir, SEGMENTS_DIR)
+    merged = VectorStore([load_segment(os.path.join(segments_root, name)) for name in to_merge],
+                         state['tombstones'])
+    live = [(segment, np.flatnonzero(~segment.deleted)) for segment in merged.segments]
+    embeddings = np.concatenate([np.asarray(segment.embeddings[rows]) for segment, rows in live]) \
+        if live else np.zeros((0, 0), dtype='float32')
+    chunk_texts = [segment.chunk_text(i) for segment, rows in live for i in rows]
+    source_files = [segment.source_file(i) for segment, rows in live for i in rows]
+    chunk_ids = np.concatenate([np.asarray(segment.ids[rows]) for segment, rows in live]) \
+        if live else np.zeros(0, dtype='int64')
+    write_segment(os.path.join(segments_root, merged_name), embeddings, chunk_texts, source_files, chunk_ids,
+                  state['index_mode'])
+
+    with _write_lock:
+        manifest = _read_manifest(store_dir)
+        manifest['segments'] = [merged_name]
+        # deletes logged during the merge are still in the new WAL
+        manifest['tombstones'] = []
+        _write_manifest(store_dir, manifest)
+    _remove_files(store_dir, to_merge, state['wal'])
+    logger.info(f"Compacted {len(to_merge)} segments into {merged_name}, "
+                f"reclaimed {sum(e - s for s, e in state['tombstones'])} deleted chunks.")
+    return True
+
+
+def compact_in_background(store_dir: str = VECTOR_STORE_DIR):
+    """Starts a compaction thread unless one is already running."""
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return
+    _compaction_thread = threading.Thread(target=_safe_compact, args=(store_dir,), daemon=True)
+    _compaction_thread.start()
+
+
+def _safe_compact(store_dir):
+    try:
+        compact(store_dir)
+    except Exception as e:
+        logger.error(f"Vector store compaction failed: {e}")
+
+
+def _remove_files(store_dir, segment_names, wal_name):
+    # readers that still map the old files keep working, the OS frees them on unmap
+    for name in segment_names:
+        shutil.rmtree(os.path.join(store_dir, SEGMENTS_DIR, name), ignore_errors=True)
+    wal_path = os.path.join(store_dir, wal_name)
+    if os.path.exists(wal_path):
+        os.remove(wal_path)
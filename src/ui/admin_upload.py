@@ -1,12 +1,16 @@
 import streamlit as st
 import os
-import json
+import time
+import pandas as pd
 from datetime import datetime
 
-from document_processing.text_extractor import extract_text
-from document_processing.metadata_extractor import extract_metadata
-from services.index_manager import add_document_to_index, remove_document_from_index
-from services.indexing_service import process_and_embed_document
+from document_processing.sheet_cache import remove_sheet_cache
+from services.index_manager import remove_document_from_index
+from services.indexing_service import remove_document_from_vector_store
+from services.ingestion_service import get_ingestion_queue, STAGES, FINAL_STATUSES
+from services.metrics_service import load_spans, summarize_spans
+from services.embedding_cache import get_query_cache, cache_table_sizes
+from services.embedding_service import get_document_scheduler
 from .localization import get_text
 from services.logger_service import setup_logger
 
@@ -35,11 +39,18 @@ def get_all_files():
     return sorted(files_info, key=lambda x: x['modified'], reverse=True)
 
 def delete_file(file_path, filename, lang):
-    """Deletes a file and removes it from the metadata index, with logging."""
+    """Deletes a file with its processed text, metadata and vectors, with logging."""
     admin_user = st.session_state.get("role", "Unknown Admin")
     try:
         os.remove(file_path)
         remove_document_from_index(filename)
+        remove_document_from_vector_store(filename)
+        remove_sheet_cache(file_path)
+        base_filename = os.path.splitext(filename)[0]
+        for derived_path in (os.path.join(PROCESSED_FOLDER, f"{base_filename}.txt"),
+                             os.path.join(METADATA_FOLDER, f"{base_filename}.json")):
+            if os.path.exists(derived_path):
+                os.remove(derived_path)
         logger.warning(f"User '{admin_user}' DELETED file: '{filename}'.")
         st.success(f"'{filename}' " + get_text(lang, "delete_success"))
         return True
@@ -54,8 +65,9 @@ def admin_upload_page(lang):
     tab1_title = get_text(lang, "upload_tab")
     tab2_title = get_text(lang, "manage_tab")
     tab3_title = get_text(lang, "bulk_ops_tab")
+    tab4_title = get_text(lang, "performance_tab")
     
-    tab1, tab2, tab3 = st.tabs([f"📤 {tab1_title}", f"📁 {tab2_title}", f"🔧 {tab3_title}"])
+    tab1, tab2, tab3, tab4 = st.tabs([f"📤 {tab1_title}", f"📁 {tab2_title}", f"🔧 {tab3_title}", f"⏱️ {tab4_title}"])
     
     with tab1:
         upload_section(lang)
@@ -63,6 +75,8 @@ def admin_upload_page(lang):
         view_documents_section(lang)
     with tab3:
         bulk_operations_section(lang)
+    with tab4:
+        performance_section(lang)
 
 
 def upload_section(lang):
@@ -81,45 +95,50 @@ def upload_section(lang):
             tags_list = [tag.strip() for tag in tags_input.split(',') if tag.strip()]
             admin_user = st.session_state.get("role", "Unknown Admin")
             
-            total_success, total_error = 0, 0
+            # only the raw files are written here, the rest runs in the background ingestion queue
+            queued_files = []
             for uploaded_file in uploaded_files:
-                with st.spinner(f"Processing '{uploaded_file.name}'..."):
-                    try:
-                        # standard processing steps:
-                        file_type = uploaded_file.name.split('.')[-1].lower()
-                        folder_map = {"pdf": "pdf", "docx": "word", "xlsx": "excel", "pptx": "pptx"}
-                        folder = folder_map.get(file_type)
-                        file_path = os.path.join(UPLOAD_FOLDER, folder, uploaded_file.name)
-                        with open(file_path, "wb") as f: f.write(uploaded_file.getbuffer())
-                        text_content = extract_text(file_path)
-                        base_filename = os.path.splitext(uploaded_file.name)[0]
-                        processed_file_path = os.path.join(PROCESSED_FOLDER, f"{base_filename}.txt")
-                        with open(processed_file_path, "w", encoding="utf-8") as f: f.write(text_content)
-                        metadata = extract_metadata(file_path)
-                        metadata['team'], metadata['tags'] = assigned_team, tags_list
-                        metadata_file_path = os.path.join(METADATA_FOLDER, f"{base_filename}.json")
-                        with open(metadata_file_path, "w", encoding="utf-8") as f: json.dump(metadata, f, indent=4)
-                        add_document_to_index(metadata)
-                        logger.info(f"User '{admin_user}' UPLOADED file '{uploaded_file.name}'.")
-
-                        # Automated Embedding with Detailed Feedback
-                        success, message = process_and_embed_document(uploaded_file.name)
-                        
-                        if success:
-                            st.write(f"✅ '{uploaded_file.name}' - " + get_text(lang, "index_success"))
-                            total_success += 1
-                        else:
-                            st.error(f"'{uploaded_file.name}' - " + get_text(lang, "index_fail") + f": {message}")
-                            total_error += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Critical error during upload of '{uploaded_file.name}': {e}")
-                        st.error(f"Error processing {uploaded_file.name}: {e}")
-                        total_error += 1
+                try:
+                    start = time.perf_counter()
+                    file_type = uploaded_file.name.split('.')[-1].lower()
+                    folder_map = {"pdf": "pdf", "docx": "word", "xlsx": "excel", "pptx": "pptx"}
+                    folder = folder_map.get(file_type)
+                    file_path = os.path.join(UPLOAD_FOLDER, folder, uploaded_file.name)
+                    with open(file_path, "wb") as f: f.write(uploaded_file.getbuffer())
+                    queued_files.append({"name": uploaded_file.name, "path": file_path, "team": assigned_team,
+                                         "tags": tags_list, "write_seconds": time.perf_counter() - start})
+                    logger.info(f"User '{admin_user}' UPLOADED file '{uploaded_file.name}'.")
+                except Exception as e:
+                    logger.error(f"Critical error during upload of '{uploaded_file.name}': {e}")
+                    st.error(f"Error processing {uploaded_file.name}: {e}")
             
-            st.divider()
-            if total_success > 0: st.success(f"Finished processing. Successful: {total_success}, Failed: {total_error}.")
-            else: st.error(f"Finished processing. All {total_error} file(s) failed.")
+            if queued_files:
+                get_ingestion_queue().submit(queued_files, admin_user)
+                st.success(f"{len(queued_files)} " + get_text(lang, "queued_success"))
+
+    ingestion_jobs_section(lang)
+
+
+@st.fragment(run_every=3)
+def ingestion_jobs_section(lang):
+    """Live status of the background ingestion jobs with per-file stage timings."""
+    st.subheader(get_text(lang, "ingestion_jobs_header"))
+    jobs = get_ingestion_queue().list_jobs(limit=5)
+    if not jobs:
+        st.info(get_text(lang, "no_ingestion_jobs"))
+        return
+
+    for job in jobs:
+        files = job['files']
+        finished = sum(f['status'] in FINAL_STATUSES for f in files)
+        failed = sum(f['status'] == "failed" for f in files)
+        label = f"{job['submitted_at']} · {job['submitted_by']} · {finished}/{len(files)} " + get_text(lang, "job_progress")
+        with st.expander(label, expanded=job['finished_at'] is None or failed > 0):
+            st.progress(finished / len(files))
+            rows = [dict({"file": f['name'], "status": f['status'], "chunks": f['chunks']},
+                         **{f"{stage} (s)": f['timings'].get(stage) for stage in STAGES},
+                         error=f['error'] or "") for f in files]
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
 
 
 def view_documents_section(lang):
@@ -217,4 +236,25 @@ def bulk_operations_section(lang):
         total_docs = len(files)
         total_size_mb = sum(f['size'] for f in files) / (1024 * 1024)
         st.metric(label=get_text(lang, "total_documents"), value=total_docs)
-        st.metric(label=get_text(lang, "total_storage_used"), value=f"{total_size_mb:.2f} MB")
\ No newline at end of file
+        st.metric(label=get_text(lang, "total_storage_used"), value=f"{total_size_mb:.2f} MB")
+
+
+def performance_section(lang):
+    """p50/p95 latency per instrumented stage from logs/metrics.jsonl, with cache statistics."""
+    st.subheader(get_text(lang, "performance_header"))
+    windows = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+    window = st.selectbox(get_text(lang, "metrics_window_label"), list(windows), index=1)
+    summary = summarize_spans(load_spans(since_seconds=windows[window]))
+    if summary:
+        st.dataframe(pd.DataFrame(summary), hide_index=True, use_container_width=True)
+    else:
+        st.info(get_text(lang, "no_metrics"))
+
+    st.subheader(get_text(lang, "cache_stats_header"))
+    query_stats = get_query_cache().get_stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric(get_text(lang, "query_cache_hit_rate"), f"{query_stats['hit_rate']:.0%}")
+    col2.metric(get_text(lang, "embedding_api_requests"), get_document_scheduler().stats["requests"])
+    col3.metric(get_text(lang, "rate_limited_requests"), get_document_scheduler().stats["rate_limited"])
+    st.dataframe(pd.DataFrame([{"table": table, "rows": rows} for table, rows in cache_table_sizes().items()]),
+                 hide_index=True)
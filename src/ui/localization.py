@@ -68,6 +68,18 @@ TRANSLATIONS = {
         "all_files_option": "Hamısı",
         "index_success": "Uğurla indeksləndi",
         "index_fail": "İndeksləmə alınmadı",
+        "queued_success": "fayl emal növbəsinə əlavə edildi. Gedişatı aşağıda izləyə bilərsiniz.",
+        "ingestion_jobs_header": "Emal Tapşırıqları",
+        "no_ingestion_jobs": "Hələ heç bir emal tapşırığı yoxdur.",
+        "job_progress": "fayl hazırdır",
+        "performance_tab": "Performans",
+        "performance_header": "Mərhələlər üzrə gecikmə",
+        "metrics_window_label": "Dövr",
+        "no_metrics": "Seçilmiş dövr üçün ölçü yoxdur.",
+        "cache_stats_header": "Keş statistikası",
+        "query_cache_hit_rate": "Sorğu embedding keş isabəti",
+        "embedding_api_requests": "Embedding API sorğuları",
+        "rate_limited_requests": "Limitə düşən sorğular",
     },
     "en": {
         "page_title": "Document Navigator",
@@ -126,6 +138,18 @@ TRANSLATIONS = {
         "all_files_option": "All",
         "index_success": "Successfully indexed",
         "index_fail": "Indexing failed",
+        "queued_success": "file(s) queued for processing. Progress is shown below.",
+        "ingestion_jobs_header": "Ingestion Jobs",
+        "no_ingestion_jobs": "No ingestion jobs yet.",
+        "job_progress": "files ready",
+        "performance_tab": "Performance",
+        "performance_header": "Latency by Stage",
+        "metrics_window_label": "Window",
+        "no_metrics": "No measurements for the selected window.",
+        "cache_stats_header": "Cache Statistics",
+        "query_cache_hit_rate": "Query embedding hit rate",
+        "embedding_api_requests": "Embedding API requests",
+        "rate_limited_requests": "Rate-limited requests",
         "analysis_expander_label": "Temporary Document Analysis (Not Added to Main Library)",
         "analysis_info_ready": "is ready for analysis. You can use the buttons below.",
     }
@@ -4,13 +4,19 @@ import os
 import re
 import json
 
-from services.search import semantic_search
-from services.qa_service import get_answer_from_llm
+from services.search import semantic_search, cached_query_embedding, MIN_RELEVANCE_SCORE
+from services.qa_service import get_answer_from_llm, stream_answer_from_llm
+from services.reranker import rerank_results, RERANK_RESULTS, RERANK_CANDIDATES
 from services.insight_service import extract_insights
 from services.access_control import get_accessible_documents
 from services.charting_service import create_chart
+from services.metrics_service import span
+from services.chat_history import build_chat_history, SUMMARY_STATE_KEY
 from .localization import get_text
 
+# answers are streamed into the chat as they are generated; "0" waits for the complete JSON answer
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "1") != "0"
+
 def user_dashboard_page(user_role, lang):
     st.sidebar.title(get_text(lang, "nav_header"))
     
@@ -28,6 +34,7 @@ def user_dashboard_page(user_role, lang):
     if page == page_options[lang][0]:
         if st.sidebar.button(get_text(lang, "new_chat_button")):
             st.session_state.messages = []
+            st.session_state.pop(SUMMARY_STATE_KEY, None)
             st.rerun()
         chatbot_page(user_role, lang)
     elif page == page_options[lang][1]:
@@ -87,39 +94,61 @@ def chatbot_page(user_role, lang):
     if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
         last_prompt = st.session_state.messages[-1]["content"]
         with st.chat_message("assistant", avatar="🤖"):
-            with st.spinner(get_text(lang, "generating_answer_spinner")):
-                search_results = semantic_search(query=last_prompt, user_role=user_role, top_k=5)
+            # one trace per chat turn, the search and answer spans nest under it
+            with span("chat_turn", role=user_role, history_messages=len(st.session_state.messages),
+                      streamed=STREAM_ANSWERS) as turn:
+                with st.spinner(get_text(lang, "generating_answer_spinner")):
+                    # nothing relevant -> empty context -> answered without an LLM call
+                    search_results = semantic_search(query=last_prompt, user_role=user_role,
+                                                     top_k=RERANK_CANDIDATES if RERANK_RESULTS else 5,
+                                                     min_score=MIN_RELEVANCE_SCORE)
+                    if RERANK_RESULTS:
+                        # a wider candidate set is cut down to the few chunks that best match the question
+                        search_results = rerank_results(last_prompt, search_results)
                 context_with_sources = [f"[Source: {item['original_filename']}]\n{item['chunk_text']}" for item in search_results] if search_results else []
                 
-                chat_history_for_llm = st.session_state.get("messages", [])
-                json_response_str = get_answer_from_llm(
+                # the question itself is sent separately; older turns are folded into a running summary
+                chat_history_for_llm = build_chat_history(st.session_state.messages[:-1], st.session_state)
+                answer_args = dict(
                     query=last_prompt, 
                     context_chunks=context_with_sources, 
-                    chat_history=chat_history_for_llm
+                    chat_history=chat_history_for_llm,
+                    # cached by semantic_search; None after a BM25-only search, which then skips the answer cache
+                    query_embedding=cached_query_embedding(last_prompt) if search_results else None,
+                    chunk_ids=[item['chunk_id'] for item in search_results],
+                    user_role=user_role,
+                    source_files=[item['source_file'] for item in search_results]
                 )
-                
-                try:
-                    response_data = json.loads(json_response_str)
-                    
-                    # LLM-in seçdiyi mənbənin adını cavabdan götürürük
-                    llm_chosen_filename = response_data.get("source_filename")
-                    
-                    # Həmin ada uyğun fayl yolunu (filepath) axtarış nəticələrindən tapırıq
-                    final_source_filepath = None
-                    if llm_chosen_filename and search_results:
-                        for result in search_results:
-                            if result['original_filename'] == llm_chosen_filename:
-                                final_source_filepath = result['original_filepath']
-                                break
-                    
-                    # Yekun məlumatları sessiyaya yazırıq
-                    response_data["source_filepath"] = final_source_filepath
-                    
-                    st.session_state.messages.append({"role": "assistant", "content": response_data})
-                except (json.JSONDecodeError, KeyError) as e:
-                    err_msg = {"answer_text": f"AI cavab formatında xəta baş verdi: {e}", "chart_info": None, "source_filename": None}
-                    st.session_state.messages.append({"role": "assistant", "content": err_msg})
-                st.rerun()
+                if STREAM_ANSWERS:
+                    # the answer appears as it is generated, source and chart info arrive at the end
+                    answer_stream = stream_answer_from_llm(**answer_args)
+                    st.write_stream(answer_stream)
+                    response_data = answer_stream.result or {"answer_text": "", "chart_info": None, "source_filename": None}
+                else:
+                    with st.spinner(get_text(lang, "generating_answer_spinner")):
+                        json_response_str = get_answer_from_llm(**answer_args)
+                    try:
+                        response_data = json.loads(json_response_str)
+                    except json.JSONDecodeError as e:
+                        response_data = {"answer_text": f"AI cavab formatında xəta baş verdi: {e}", "chart_info": None, "source_filename": None}
+                turn["response_chars"] = len(response_data.get("answer_text") or "")
+
+            # LLM-in seçdiyi mənbənin adını cavabdan götürürük
+            llm_chosen_filename = response_data.get("source_filename")
+            
+            # Həmin ada uyğun fayl yolunu (filepath) axtarış nəticələrindən tapırıq
+            final_source_filepath = None
+            if llm_chosen_filename and search_results:
+                for result in search_results:
+                    if result['original_filename'] == llm_chosen_filename:
+                        final_source_filepath = result['original_filepath']
+                        break
+            
+            # Yekun məlumatları sessiyaya yazırıq
+            response_data["source_filepath"] = final_source_filepath
+            
+            st.session_state.messages.append({"role": "assistant", "content": response_data})
+            st.rerun()
 
     if st.session_state.messages: auto_scroll()
 
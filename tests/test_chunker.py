@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.document_processing.chunker import chunk_text, estimate_tokens, MAX_TOKENS
+
+
+def test_word_longer_than_max_tokens_is_cut():
+    chunks = chunk_text("x" * 5000)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= MAX_TOKENS for chunk in chunks)
+    assert "".join(chunks) == "x" * 5000
+
+
+def test_punctuation_run_is_cut():
+    chunks = chunk_text("Cədvəl: " + "." * 3000 + " səh. 4")
+    assert all(estimate_tokens(chunk) <= MAX_TOKENS for chunk in chunks)
+
+
+def test_long_word_inside_text_keeps_the_words_around_it():
+    text = "Ödəniş linki " + "a1" * 1500 + " bu gün aktivdir."
+    chunks = chunk_text(text, max_tokens=200)
+    assert all(estimate_tokens(chunk) <= 200 for chunk in chunks)
+    assert chunks[0].startswith("Ödəniş linki")
+    assert chunks[-1].endswith("bu gün aktivdir.")
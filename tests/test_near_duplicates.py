@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.document_processing.chunker import chunk_text
+from src.document_processing.near_duplicates import collapse_near_duplicates
+
+DOCUMENTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed_documents')
+
+AXIS = "\n".join(["n a y v e f-n a y tr a m -n a y r p a -n a y y a m -n a y n u y i-n a y lu y i"] * 6)
+BOILERPLATE = ("Bu sənəd Azərbaycan Respublikası Mərkəzi Bankının rəsmi nəşridir. Məlumatlardan istifadə "
+               "edərkən mənbəyə istinad mütləqdir. Sənəddə göstərilən rəqəmlər ilkin məlumatlara əsaslanır "
+               "və dəqiqləşdirilə bilər.")
+
+
+def test_prose_inside_chart_noise_is_kept():
+    chunks = [AXIS + "\nistehlak kreditləri 2024-cü ildə 21.7% artmışdır.",
+              AXIS + "\nmənzil tikintisi üzrə investisiyaların həcmi 92.8% artmışdır."]
+    kept, dropped = collapse_near_duplicates(chunks)
+    assert dropped == 0
+    assert kept == chunks
+
+
+def test_rows_that_differ_in_figures_stay_apart():
+    rows = [f"Yanvar ayında ixrac {a} mln dollar, idxal {b} mln dollar, saldo {c} mln dollar olmuşdur."
+            for a, b, c in (("2 140.5", "1 310.2", "830.3"), ("2 250.1", "1 290.7", "959.4"))]
+    assert collapse_near_duplicates(rows)[1] == 0
+
+
+def test_repeated_boilerplate_is_dropped():
+    chunks = [BOILERPLATE + "\n3", "Faiz dəhlizinin parametrləri dəyişdirilmişdir.",
+              BOILERPLATE.replace(". ", ".\n") + "\n4"]
+    kept, dropped = collapse_near_duplicates(chunks)
+    assert dropped == 1
+    assert kept == chunks[:2]
+
+
+def test_no_fact_of_the_february_review_is_lost():
+    with open(os.path.join(DOCUMENTS_DIR, "pul siyaseti icmali - fevral 2025.txt"), 'r', encoding='utf-8') as f:
+        chunks = chunk_text(f.read())
+    kept, _ = collapse_near_duplicates(chunks)
+    assert any("92.8%" in chunk for chunk in kept)